@@ -0,0 +1,93 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Собирает одиночные запросы в пачки: до max_size элементов или max_wait_ms ожидания
+
+    handler получает список элементов и должен вернуть список результатов
+    той же длины и в том же порядке. Пачки обрабатываются параллельно,
+    сбор следующей пачки не ждёт завершения предыдущей.
+    С max_weight сумма weight(элемент) в пачке не превышает max_weight:
+    элемент, который не поместился, открывает следующую пачку.
+    """
+
+    def __init__(self, handler, max_size: int = 8, max_wait_ms: int = 50, weight=None, max_weight: float = 0):
+        self.handler = handler
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait_ms / 1000
+        self.weight = weight
+        self.max_weight = max_weight if weight is not None else 0
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._dispatches = set()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Дожидаемся уже отправленных пачек
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+    async def submit(self, item):
+        """Поставить элемент в очередь и дождаться его результата"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        carried = None
+        while True:
+            first = carried or await self._queue.get()
+            carried = None
+            batch = [first]
+            total = self.weight(first[0]) if self.max_weight else 0
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if self.max_weight:
+                    weight = self.weight(entry[0])
+                    if total + weight > self.max_weight:
+                        carried = entry
+                        break
+                    total += weight
+                batch.append(entry)
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: list):
+        items = [item for item, _ in batch]
+        try:
+            results = await self.handler(items)
+            if len(results) != len(items):
+                raise ValueError(f"handler вернул {len(results)} результатов на {len(items)} элементов")
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки пачки из {len(items)}: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Привести текст к каноническому виду: NFKC, регистр, схлопнутые пробелы"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(text: str, model: str, prompt_version: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, prompt_version, normalize(text)):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ClassificationCache:
+    """Кэш классификаций по хэшу содержимого
+
+    Два уровня: LRU в памяти процесса и (опционально) общий Redis.
+    Оба уровня хранят записи не дольше ttl секунд; LRU ограничен max_size записей.
+    """
+
+    def __init__(self, model: str, prompt_version: str, max_size: int = 10000,
+                 ttl: int = 86400, redis_url: str = ""):
+        self.model = model
+        self.prompt_version = prompt_version
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.redis = None
+        self._lru = OrderedDict()
+        # Счётчики попаданий/промахов
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    async def start(self):
+        if not self.redis_url:
+            return
+        import redis.asyncio as aioredis
+
+        self.redis = aioredis.from_url(self.redis_url)
+        try:
+            await self.redis.ping()
+            logger.info(f"✅ Classification cache: Redis tier at {self.redis_url}")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis недоступен, кэш только в памяти: {e}")
+            await self.redis.aclose()
+            self.redis = None
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+        logger.info(f"🛑 Classification cache: {self.stats()}")
+
+    def key(self, text: str) -> str:
+        return cache_key(text, self.model, self.prompt_version)
+
+    async def get(self, text: str):
+        """Вернуть сохранённую классификацию или None"""
+        key = self.key(text)
+
+        entry = self._lru.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                CACHE_LOOKUPS.labels("memory_hit").inc()
+                return value
+            del self._lru[key]
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(f"classification:{key}")
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка чтения кэша Redis: {e}")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._remember(key, value)
+                self.redis_hits += 1
+                CACHE_LOOKUPS.labels("redis_hit").inc()
+                return value
+
+        self.misses += 1
+        CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    async def put(self, text: str, value: dict):
+        key = self.key(text)
+        self._remember(key, value)
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"classification:{key}", json.dumps(value, ensure_ascii=False), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка записи кэша Redis: {e}")
+
+    def _remember(self, key: str, value: dict):
+        self._lru[key] = (time.monotonic() + self.ttl, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        hits = self.memory_hits + self.redis_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "size": len(self._lru),
+        }
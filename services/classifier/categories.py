@@ -0,0 +1,3 @@
+"""Категории классификатора — общие для сервиса и офлайн-обучения быстрой модели"""
+
+CATEGORIES = ["задача", "идея", "вопрос", "заметка"]
@@ -0,0 +1,75 @@
+"""Ограничение размера промпта для длинных документов
+
+Длинный текст не отправляется в модель целиком: берутся окна в пределах
+бюджета токенов, поэтому время ответа почти не зависит от размера документа.
+"""
+from collections import Counter
+
+
+def estimate_tokens(text: str, chars_per_token: float) -> int:
+    """Грубая оценка числа токенов без токенизатора модели"""
+    return int(len(text) / chars_per_token) + 1
+
+
+def _window(text: str, start: int, size: int) -> str:
+    """Окно длиной до size символов, выровненное по пробелам"""
+    end = min(len(text), start + size)
+    if start > 0:
+        space = text.find(" ", start, end)
+        if space != -1:
+            start = space + 1
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        if space > start:
+            end = space
+    return text[start:end].strip()
+
+
+def window_starts(length: int, size: int, count: int) -> list:
+    """Равномерно разнесённые начала count окон: первое в начале текста, последнее в конце"""
+    if count <= 1 or length <= size:
+        return [0]
+    step = (length - size) / (count - 1)
+    return [int(i * step) for i in range(count)]
+
+
+def sample_windows(text: str, budget_chars: int, windows: int = 3) -> str:
+    """Начало, середина и конец документа, всего не больше budget_chars символов"""
+    if len(text) <= budget_chars:
+        return text
+    size = budget_chars // windows
+    parts = [_window(text, start, size) for start in window_starts(len(text), size, windows)]
+    return "\n…\n".join(part for part in parts if part)
+
+
+def split_windows(text: str, budget_chars: int, max_chunks: int) -> list:
+    """До max_chunks окон по budget_chars символов, равномерно по всему документу"""
+    if len(text) <= budget_chars:
+        return [text]
+    count = min(max_chunks, -(-len(text) // budget_chars))
+    chunks = [_window(text, start, budget_chars) for start in window_starts(len(text), budget_chars, count)]
+    return [chunk for chunk in chunks if chunk]
+
+
+def vote(results: list) -> dict:
+    """Объединить классификации фрагментов голосованием большинства
+
+    Уверенность — сумма уверенностей голосов за победителя, делённая на число
+    голосовавших фрагментов. Фрагменты с ошибкой не голосуют.
+    """
+    valid = [r for r in results if "ошибка" not in r["tags"]]
+    if not valid:
+        return results[0]
+
+    votes = Counter(r["tags"][0] for r in valid)
+    weight = Counter()
+    for r in valid:
+        weight[r["tags"][0]] += r["confidence"]
+    winner = max(votes, key=lambda category: (votes[category], weight[category]))
+
+    return {
+        "tags": [winner],
+        "confidence": weight[winner] / len(valid),
+        "processing_time_ms": max(r["processing_time_ms"] for r in results),
+        "model": valid[0].get("model"),
+    }
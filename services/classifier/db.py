@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+
+import asyncpg
+
+from metrics import DB_FLUSH_ROWS, DB_FLUSH_SECONDS, DUPLICATES, ERRORS
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["document_id", "tags", "confidence", "created_at"]
+UNIQUE_INDEX = "classifications_document_id_key"
+# Ключ advisory-блокировки, под которой воркеры по очереди меняют схему
+SCHEMA_LOCK = 7_301_001
+
+
+def _id_key(document_id) -> str:
+    """document_id в том виде, в каком его вернёт document_id::text (UUID — в каноническом)"""
+    try:
+        return str(uuid.UUID(str(document_id)))
+    except ValueError:
+        return str(document_id)
+
+
+class ClassificationWriter:
+    """Отложенная запись классификаций в Postgres пачками через пул соединений
+
+    Строки копятся в буфере и сбрасываются одной операцией, когда их набралось
+    batch_size или прошло flush_interval_ms с прошлого сброса.
+    С unique=True на document_id создаётся уникальный индекс, а повторные
+    строки пропускаются через ON CONFLICT DO NOTHING (COPY идёт через
+    временную таблицу, потому что сам COPY конфликты не обрабатывает).
+    """
+
+    def __init__(self, dsn: str, batch_size: int = 100, flush_interval_ms: int = 200,
+                 min_pool: int = 1, max_pool: int = 4, method: str = "copy",
+                 store_content: bool = False, unique: bool = False):
+        self.dsn = dsn
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.min_pool = min_pool
+        self.max_pool = max_pool
+        # copy — COPY через copy_records_to_table, executemany — пачка INSERT
+        self.method = method
+        # Дополнительно писать колонку content (обучающие данные для быстрой модели)
+        self.store_content = store_content
+        self.columns = COLUMNS + ["content"] if store_content else COLUMNS
+        self.unique = unique
+        self.pool = None
+        self._buffer = []
+        self._waiters = []
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._closing = False
+        # Статистика сбросов
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.rows_skipped = 0
+        self.last_flush_size = 0
+        self.last_flush_ms = 0.0
+
+    async def start(self):
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_pool, max_size=self.max_pool)
+        await self.prepare_schema()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"✅ DB pool ready (size {self.min_pool}-{self.max_pool}, "
+                    f"batch {self.batch_size}, flush every {self.flush_interval * 1000:.0f} ms, {self.method})")
+
+    async def close(self):
+        """Дождаться, пока фоновый сброс допишет буфер, и закрыть пул
+
+        Задача сброса не отменяется: отмена посреди записи теряла бы уже
+        взятую из буфера пачку, а её future так и не получили бы результат.
+        """
+        self._closing = True
+        if self._task is not None:
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+        logger.info(f"🛑 DB writer closed: {self.rows_written} rows in {self.flushes} flushes, "
+                    f"{self.rows_skipped} duplicates skipped, {self.rows_failed} failed")
+
+    async def prepare_schema(self):
+        """Добавить колонку content (store_content) и уникальный индекс (unique), если их нет
+
+        Воркеры runner.py и реплики стартуют одновременно, поэтому DDL идёт под
+        advisory-блокировкой: схему меняет первый, остальные ждут его и находят
+        всё готовым благодаря IF NOT EXISTS.
+        """
+        if not (self.store_content or self.unique):
+            return
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.fetchval("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK)
+                if self.store_content:
+                    await conn.execute("ALTER TABLE classifications ADD COLUMN IF NOT EXISTS content TEXT")
+                    logger.info("✅ Column classifications.content ready")
+                if self.unique:
+                    await self.ensure_unique_index(conn)
+
+    async def ensure_unique_index(self, conn):
+        """Создать уникальный индекс по document_id, если его нет
+
+        Если в таблице уже есть дубликаты, индекс не создаётся, а запись
+        продолжает работать без ON CONFLICT — дубликаты нужно сначала удалить.
+        Перед отказом от ON CONFLICT проверяется, не готов ли индекс уже
+        (например, его создала другая реплика).
+        """
+        try:
+            # Вложенная транзакция — точка сохранения: ошибка не обрывает внешнюю
+            async with conn.transaction():
+                await conn.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX} ON classifications (document_id)"
+                )
+        except Exception as e:
+            if not await conn.fetchval("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)",
+                                       UNIQUE_INDEX):
+                self.unique = False
+                logger.error(f"❌ Не удалось создать уникальный индекс по document_id, "
+                             f"запись без ON CONFLICT: {e}")
+                return
+        logger.info(f"✅ Unique index {UNIQUE_INDEX} on classifications(document_id)")
+
+    async def exists(self, document_id: str) -> bool:
+        """Есть ли уже классификация документа"""
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM classifications WHERE document_id = $1)", document_id
+            )
+
+    async def iter_document_ids(self, chunk: int = 50000):
+        """Все сохранённые document_id пачками, через серверный курсор"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor("SELECT document_id::text FROM classifications")
+                while True:
+                    rows = await cursor.fetch(chunk)
+                    if not rows:
+                        return
+                    yield [row[0] for row in rows]
+
+    def add(self, document_id: str, tags: list, confidence: float, content: str = None) -> asyncio.Future:
+        """Поставить строку в очередь на запись
+
+        Возвращает future, который получит True, если строка записана,
+        None, если документ уже был в таблице (его сохранил другой воркер
+        или реплика), и False, если запись не удалась.
+        """
+        future = asyncio.get_running_loop().create_future()
+        row = (document_id, tags, confidence, datetime.now(timezone.utc))
+        if self.store_content:
+            row += (content,)
+        self._buffer.append(row)
+        self._waiters.append(future)
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+        return future
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+        # Строки, добавленные во время последнего сброса
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            while self._buffer:
+                rows = self._buffer[:self.batch_size]
+                waiters = self._waiters[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                del self._waiters[:self.batch_size]
+                inserted = await self._write(rows)
+                for row, future in zip(rows, waiters):
+                    if future.done():
+                        continue
+                    if inserted is None:
+                        future.set_result(False)
+                    elif _id_key(row[0]) in inserted:
+                        # Повтор внутри одной пачки: записанной считается только первая строка
+                        inserted.discard(_id_key(row[0]))
+                        future.set_result(True)
+                    else:
+                        future.set_result(None)
+
+    async def _write(self, rows: list):
+        """Записать пачку; вернуть множество реально вставленных document_id или None при ошибке"""
+        started = time.perf_counter()
+        try:
+            async with self.pool.acquire() as conn:
+                if self.method == "copy" and self.unique:
+                    inserted = await self._copy_on_conflict(conn, rows)
+                elif self.method == "copy":
+                    await conn.copy_records_to_table("classifications", records=rows, columns=self.columns)
+                    inserted = {_id_key(row[0]) for row in rows}
+                elif self.unique:
+                    inserted = await self._insert_on_conflict(conn, rows)
+                else:
+                    placeholders = ", ".join(f"${i}" for i in range(1, len(self.columns) + 1))
+                    await conn.executemany(f"""
+                        INSERT INTO classifications ({", ".join(self.columns)})
+                        VALUES ({placeholders})
+                    """, rows)
+                    inserted = {_id_key(row[0]) for row in rows}
+        except Exception as e:
+            self.rows_failed += len(rows)
+            ERRORS.labels("db_flush").inc()
+            logger.error(f"Ошибка сохранения в БД ({len(rows)} строк): {e}")
+            return None
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.rows_written += len(inserted)
+        self.rows_skipped += len(rows) - len(inserted)
+        self.last_flush_size = len(rows)
+        self.last_flush_ms = elapsed_ms
+        DB_FLUSH_SECONDS.observe(elapsed_ms / 1000)
+        DB_FLUSH_ROWS.observe(len(rows))
+        if len(inserted) < len(rows):
+            DUPLICATES.labels("db_conflict").inc(len(rows) - len(inserted))
+        logger.info(f"💾 Сохранено в БД: {len(inserted)} строк за {elapsed_ms:.1f} ms")
+        return inserted
+
+    async def _copy_on_conflict(self, conn, rows: list) -> set:
+        """COPY во временную таблицу, затем INSERT ... ON CONFLICT; вернуть вставленные document_id"""
+        columns = ", ".join(self.columns)
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS classifications_incoming
+                (LIKE classifications INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+            """)
+            await conn.copy_records_to_table("classifications_incoming", records=rows, columns=self.columns)
+            records = await conn.fetch(f"""
+                INSERT INTO classifications ({columns})
+                SELECT {columns} FROM classifications_incoming
+                ON CONFLICT (document_id) DO NOTHING
+                RETURNING document_id::text
+            """)
+        return {_id_key(record[0]) for record in records}
+
+    async def _insert_on_conflict(self, conn, rows: list) -> set:
+        """INSERT ... ON CONFLICT построчно через подготовленный запрос; вернуть вставленные document_id"""
+        placeholders = ", ".join(f"${i}" for i in range(1, len(self.columns) + 1))
+        inserted = set()
+        async with conn.transaction():
+            statement = await conn.prepare(f"""
+                INSERT INTO classifications ({", ".join(self.columns)})
+                VALUES ({placeholders})
+                ON CONFLICT (document_id) DO NOTHING
+                RETURNING document_id::text
+            """)
+            for row in rows:
+                document_id = await statement.fetchval(*row)
+                if document_id is not None:
+                    inserted.add(_id_key(document_id))
+        return inserted
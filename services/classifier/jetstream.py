@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+from nats.errors import TimeoutError as NatsTimeoutError
+from nats.js.api import AckPolicy, ConsumerConfig, DeliverPolicy
+from nats.js.errors import NotFoundError
+
+logger = logging.getLogger(__name__)
+
+
+async def ensure_stream(js, name: str, subjects: list):
+    """Создать поток JetStream, если его ещё нет, или добавить в него недостающие темы"""
+    try:
+        info = await js.stream_info(name)
+    except NotFoundError:
+        await js.add_stream(name=name, subjects=subjects)
+        logger.info(f"✅ Created JetStream stream {name} for {subjects}")
+        return
+
+    current = list(info.config.subjects or [])
+    missing = [subject for subject in subjects if subject not in current]
+    if missing:
+        info.config.subjects = current + missing
+        await js.update_stream(config=info.config)
+        logger.info(f"✅ Added {missing} to JetStream stream {name}")
+
+
+async def pull_subscribe(js, subject: str, stream: str, durable: str,
+                         max_ack_pending: int, ack_wait: float):
+    """Durable pull-консьюмер с явным подтверждением
+
+    max_ack_pending ограничивает число выданных, но не подтверждённых сообщений —
+    сервер перестаёт отдавать новые, пока мы не догоним.
+    Настройки применяются только при создании консьюмера.
+    """
+    config = ConsumerConfig(
+        durable_name=durable,
+        ack_policy=AckPolicy.EXPLICIT,
+        deliver_policy=DeliverPolicy.ALL,
+        max_ack_pending=max_ack_pending,
+        ack_wait=ack_wait,
+    )
+    return await js.pull_subscribe(subject, durable=durable, stream=stream, config=config)
+
+
+async def pull_loop(sub, dispatch, batch: int, timeout: float = 5.0, ready=None):
+    """Забирать сообщения пачками и отдавать их в dispatch
+
+    Сколько сообщений выдано, но ещё не подтверждено, ограничивает сервер
+    (max_ack_pending консьюмера), поэтому очередь за dispatch не растёт без предела.
+    ready — корутина, которую ждём перед каждым fetch (например, пока
+    бэкенд недоступен); сообщения тем временем остаются на сервере.
+    """
+    while True:
+        if ready is not None:
+            await ready()
+        try:
+            msgs = await sub.fetch(batch=batch, timeout=timeout)
+        except NatsTimeoutError:
+            continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка fetch из JetStream: {e}")
+            await asyncio.sleep(1)
+            continue
+
+        for msg in msgs:
+            await dispatch(msg)
+
+
+def hold_in_progress(msg, ack_wait: float) -> asyncio.Task:
+    """Продлевать срок подтверждения сообщения, пока задачу не отменят"""
+    return asyncio.create_task(_keep_in_progress(msg, ack_wait / 2))
+
+
+async def process_with_ack(process, msg, ack_wait: float, nak_delay: float, heartbeat: asyncio.Task = None):
+    """Обработать сообщение JetStream и подтвердить его по результату
+
+    Пока идёт обработка, срок подтверждения продлевается через in_progress,
+    чтобы долгий вызов LLM не приводил к повторной доставке.
+    heartbeat — уже запущенное продление (hold_in_progress), например пока
+    сообщение ждало в очереди; без него продление запускается здесь.
+    process должен вернуть True, если сообщение можно подтвердить.
+    """
+    if heartbeat is None:
+        heartbeat = hold_in_progress(msg, ack_wait)
+    try:
+        ok = await process(msg)
+    except Exception as e:
+        logger.error(f"❌ Ошибка обработки сообщения JetStream: {e}")
+        ok = False
+    finally:
+        heartbeat.cancel()
+
+    try:
+        if ok:
+            await msg.ack()
+        else:
+            await msg.nak(delay=nak_delay)
+    except Exception as e:
+        logger.error(f"❌ Не удалось подтвердить сообщение: {e}")
+
+
+async def _keep_in_progress(msg, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await msg.in_progress()
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось продлить срок подтверждения: {e}")
+            return
@@ -0,0 +1,64 @@
+"""Полосы приоритета: интерактивные документы не ждут за массовым импортом
+
+Полоса документа определяется по теме (document.ingest.<полоса>), по полю
+metadata.priority или по metadata.source. Полоса текущей задачи хранится
+в current_lane, и ограничитель запросов к Ollama делит слоты между полосами
+пропорционально их весам.
+"""
+import json
+from contextvars import ContextVar
+
+DEFAULT_LANE = "default"
+
+current_lane: ContextVar[str] = ContextVar("lane", default=DEFAULT_LANE)
+
+
+def parse_pairs(spec: str) -> dict:
+    """Разобрать строку вида "a:1,b:2" в словарь строк"""
+    pairs = {}
+    for part in spec.split(","):
+        if ":" in part:
+            key, value = part.split(":", 1)
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+
+class LaneRouter:
+    """Определение полосы документа
+
+    weights — {полоса: вес}, sources — {metadata.source: полоса}.
+    Неизвестные полосы и источники попадают в default.
+    """
+
+    def __init__(self, subject: str, weights: dict, sources: dict = None, default: str = DEFAULT_LANE):
+        self.subject = subject
+        self.weights = dict(weights) or {default: 1.0}
+        self.weights.setdefault(default, 1.0)
+        self.sources = {source: lane for source, lane in (sources or {}).items() if lane in self.weights}
+        self.default = default
+
+    @property
+    def lanes(self) -> list:
+        return list(self.weights)
+
+    def subjects(self) -> dict:
+        """Темы подписки: общая и отдельная тема на каждую полосу"""
+        subjects = {self.subject: None}
+        for lane in self.weights:
+            subjects[f"{self.subject}.{lane}"] = lane
+        return subjects
+
+    def lane_for(self, subject: str, data: bytes) -> str:
+        prefix = self.subject + "."
+        if subject.startswith(prefix) and subject[len(prefix):] in self.weights:
+            return subject[len(prefix):]
+        try:
+            metadata = json.loads(data).get("metadata") or {}
+            priority, source = metadata.get("priority"), metadata.get("source")
+        except (ValueError, AttributeError):
+            return self.default
+        if isinstance(priority, str) and priority in self.weights:
+            return priority
+        if isinstance(source, str):
+            return self.sources.get(source, self.default)
+        return self.default
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from lanes import current_lane
+from metrics import OLLAMA_IN_FLIGHT, OLLAMA_QUEUE_SECONDS, OLLAMA_SECONDS
+from resilience import AdaptiveLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaClient:
+    """Асинхронный клиент Ollama с пулом keep-alive соединений и ограничением параллелизма
+
+    Параллелизм задаёт limiter (по умолчанию — фиксированный max_concurrency).
+    Если передан breaker, запросы при разомкнутой цепи не отправляются,
+    а исход каждого запроса сообщается автомату.
+    """
+
+    def __init__(self, url: str, max_concurrency: int = 4, timeout: float = 30.0, keep_alive: str = "",
+                 limiter: AdaptiveLimiter = None, breaker=None, num_ctx: int = 0):
+        self.url = url
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        # Сколько Ollama держит модель в памяти после запроса ("30m", "-1" — всегда); пусто — по умолчанию
+        self.keep_alive = keep_alive
+        # Окно контекста во всех запросах (0 — по умолчанию Ollama). Оно должно быть одинаковым:
+        # запрос с другим num_ctx заставляет Ollama перезагрузить модель
+        self.num_ctx = num_ctx
+        self._session = None
+        # Сколько запросов одновременно отправляем в Ollama
+        self.limiter = limiter or AdaptiveLimiter(self.max_concurrency)
+        self.breaker = breaker
+        # Сколько потоковых запросов оборвали досрочно
+        self.early_stops = 0
+
+    async def start(self):
+        """Создать HTTP-сессию с постоянным пулом соединений"""
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limiter.max_limit,
+            keepalive_timeout=60,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        logger.info(f"✅ Ollama client ready: {self.url} "
+                    f"(concurrency {int(self.limiter.limit)}, max {self.limiter.max_limit})")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @asynccontextmanager
+    async def _slot(self, mode: str, model: str, probe: bool = False):
+        """Занять слот параллелизма на время запроса и отчитаться об исходе
+
+        Неудача — таймаут, обрыв соединения или ответ 5xx; ответы 4xx
+        говорят об ошибке запроса, а не бэкенда.
+        """
+        if self.breaker is not None and not probe and not self.breaker.allow():
+            raise CircuitOpenError()
+        if self._session is None:
+            await self.start()
+
+        lane = current_lane.get()
+        with OLLAMA_QUEUE_SECONDS.labels(lane).time():
+            await self.limiter.acquire(lane)
+        started = time.perf_counter()
+        ok = None
+        try:
+            with OLLAMA_IN_FLIGHT.track_inprogress():
+                yield
+            ok = True
+        except OllamaError as e:
+            ok = e.status < 500
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            ok = False
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            OLLAMA_SECONDS.labels(mode, model).observe(elapsed)
+            await self.limiter.release(elapsed * 1000, ok)
+            if ok is not None and self.breaker is not None:
+                self.breaker.record(ok)
+
+    async def generate(self, payload: dict, probe: bool = False) -> tuple[dict, float]:
+        """Отправить запрос в /api/generate, вернуть (ответ, время в мс)
+
+        Время ожидания свободного слота в замер не входит.
+        probe=True — пробный запрос, который отправляется и при разомкнутой цепи.
+        """
+        payload = self._with_defaults(payload)
+        async with self._slot("generate", payload.get("model", ""), probe):
+            started = time.perf_counter()
+            async with self._session.post(self.url, json=payload) as response:
+                if response.status != 200:
+                    body = await response.text()
+                    raise OllamaError(response.status, body[:200])
+                result = await response.json()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        return result, elapsed_ms
+
+    async def generate_stream(self, payload: dict, decide) -> tuple:
+        """Потоковый /api/generate: читать ответ, пока decide(текст) не вернёт решение
+
+        Возвращает (решение или None, накопленный текст, время в мс).
+        При досрочном решении соединение закрывается, и Ollama прекращает генерацию,
+        освобождая слот под следующий запрос.
+        """
+        payload = self._with_defaults(dict(payload, stream=True))
+        parts = []
+        decision = None
+        async with self._slot("stream", payload.get("model", "")):
+            started = time.perf_counter()
+            async with self._session.post(self.url, json=payload) as response:
+                if response.status != 200:
+                    body = await response.text()
+                    raise OllamaError(response.status, body[:200])
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise OllamaError(500, str(chunk["error"])[:200])
+                    parts.append(chunk.get("response", ""))
+                    if chunk.get("done"):
+                        break
+                    decision = decide("".join(parts))
+                    if decision is not None:
+                        self.early_stops += 1
+                        response.close()
+                        break
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        return decision, "".join(parts), elapsed_ms
+
+
+    async def warm_up(self, model: str, system: str = "", prompt: str = "", probe: bool = False) -> float:
+        """Загрузить модель и прогнать системный промпт, чтобы его префикс попал в кэш
+
+        Возвращает время в мс: первый запрос включает загрузку модели.
+        Тот же короткий запрос служит пробой для автомата отключения (probe=True).
+        """
+        _, elapsed_ms = await self.generate({
+            "model": model,
+            "system": system,
+            "prompt": prompt,
+            "stream": False,
+            "options": {"num_predict": 1},
+        }, probe=probe)
+        return elapsed_ms
+
+    def _with_defaults(self, payload: dict) -> dict:
+        """Добавить keep_alive и num_ctx клиента, если в запросе их нет"""
+        options = payload.get("options") or {}
+        if self.num_ctx and "num_ctx" not in options:
+            payload = dict(payload, options=dict(options, num_ctx=self.num_ctx))
+        if not self.keep_alive or "keep_alive" in payload:
+            return payload
+        keep_alive = self.keep_alive
+        if keep_alive.lstrip("-").isdigit():
+            keep_alive = int(keep_alive)
+        return dict(payload, keep_alive=keep_alive)
+
+
+class OllamaError(Exception):
+    """Ollama ответила статусом, отличным от 200"""
+
+    def __init__(self, status: int, body: str = ""):
+        super().__init__(f"Ollama status {status}: {body}")
+        self.status = status
+
+
+class CircuitOpenError(OllamaError):
+    """Запрос не отправлен: автомат отключения разомкнут"""
+
+    def __init__(self):
+        super().__init__(503, "circuit open")
@@ -0,0 +1,64 @@
+"""Метрики классификатора в формате Prometheus (GET http://<host>:METRICS_PORT/metrics)"""
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Границы от миллисекунд (кэш, быстрая модель) до десятков секунд (LLM)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "classifier_stage_seconds",
+    "Время этапов обработки документа",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+MESSAGES_IN = Counter("classifier_messages_in_total", "Получено сообщений document.ingest")
+MESSAGES_OUT = Counter("classifier_messages_out_total", "Опубликовано сообщений document.classified")
+ERRORS = Counter("classifier_errors_total", "Ошибки обработки", ["stage"])
+CLASSIFIED = Counter("classifier_classifications_total", "Классификации по источнику ответа", ["source"])
+CACHE_LOOKUPS = Counter("classifier_cache_lookups_total", "Обращения к кэшу классификаций", ["result"])
+DUPLICATES = Counter("classifier_duplicates_total", "Отброшенные повторы документов", ["reason"])
+SEEN_FILTER_FALSE_POSITIVES = Counter("classifier_seen_filter_false_positives_total",
+                                      "Ложные срабатывания фильтра Блума, опровергнутые БД")
+
+IN_FLIGHT = Gauge("classifier_in_flight", "Документов в обработке")
+OLLAMA_IN_FLIGHT = Gauge("classifier_ollama_in_flight", "Запросов к Ollama в работе")
+PENDING_MESSAGES = Gauge("classifier_subscription_pending_messages", "Сообщений в буфере подписки NATS")
+PENDING_BYTES = Gauge("classifier_subscription_pending_bytes", "Байт в буфере подписки NATS")
+SEEN_FILTER_ITEMS = Gauge("classifier_seen_filter_items", "Документов в фильтре обработанных")
+
+OLLAMA_CONCURRENCY_LIMIT = Gauge("classifier_ollama_concurrency_limit", "Текущий лимит параллельных запросов к Ollama")
+CIRCUIT_STATE = Gauge("classifier_circuit_state", "Автомат отключения Ollama: 0 — замкнут, 1 — проба, 2 — разомкнут")
+
+OLLAMA_SECONDS = Histogram("classifier_ollama_request_seconds", "Время запроса к Ollama", ["mode", "model"],
+                           buckets=LATENCY_BUCKETS)
+ROUTED = Counter("classifier_routed_total", "Документов, направленных в модель", ["model"])
+ESCALATED = Counter("classifier_escalations_total", "Ответов маленькой модели, переданных большой", ["model"])
+OLLAMA_QUEUE_SECONDS = Histogram("classifier_ollama_queue_seconds", "Ожидание слота Ollama по полосам", ["lane"],
+                                 buckets=LATENCY_BUCKETS)
+LANE_SECONDS = Histogram("classifier_lane_seconds", "Полное время обработки документа по полосам", ["lane"],
+                         buckets=LATENCY_BUCKETS)
+LANE_MESSAGES = Counter("classifier_lane_messages_total", "Получено документов по полосам", ["lane"])
+LANE_IN_FLIGHT = Gauge("classifier_lane_in_flight", "Документов в обработке по полосам", ["lane"])
+LANE_QUEUED = Gauge("classifier_lane_queued", "Документов в очереди полосы, ещё не взятых в работу", ["lane"])
+LANE_SHED = Counter("classifier_lane_shed_total", "Документов, отброшенных из-за переполненной очереди полосы", ["lane"])
+DB_FLUSH_SECONDS = Histogram("classifier_db_flush_seconds", "Время пакетной записи в Postgres",
+                             buckets=LATENCY_BUCKETS)
+DB_FLUSH_ROWS = Histogram("classifier_db_flush_rows", "Строк в одной пакетной записи",
+                          buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+
+def watch_subscription(*subs):
+    """Отдавать суммарный размер буферов подписок при каждом чтении метрик"""
+    PENDING_MESSAGES.set_function(lambda: sum(sub.pending_msgs for sub in subs))
+    PENDING_BYTES.set_function(lambda: sum(sub.pending_bytes for sub in subs))
+
+
+def start_metrics_server(port: int):
+    if port <= 0:
+        return
+    start_http_server(port)
+    logger.info(f"📊 Metrics on :{port}/metrics")
@@ -0,0 +1,171 @@
+"""Защита от перегрузки LLM: адаптивный лимит параллельных запросов и автомат отключения"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from metrics import CIRCUIT_STATE, OLLAMA_CONCURRENCY_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """AIMD-ограничитель числа параллельных запросов
+
+    Пока ответы укладываются в latency_slo_ms, лимит растёт примерно на 1
+    за каждые limit успешных запросов. Медленный или неудачный ответ уменьшает
+    лимит в backoff раз, но не чаще одного раза за длительность этого запроса,
+    чтобы одна волна медленных ответов не обрушила лимит до минимума.
+    С latency_slo_ms=0 лимит фиксирован.
+
+    Ожидающие слота запросы разделены по полосам (lane) и получают слоты
+    взвешенно-справедливо: у каждой полосы своё виртуальное время, которое
+    растёт на 1/вес за каждый выданный слот, и следующий слот получает
+    ожидающая полоса с наименьшим временем. Полоса с весом 8 против полосы
+    с весом 1 получает 8 слотов из 9, но ни одна не голодает.
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = None,
+                 latency_slo_ms: float = 0, backoff: float = 0.7, weights: dict = None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit or initial)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.latency_slo_ms = latency_slo_ms
+        self.backoff = backoff
+        self.in_flight = 0
+        self.weights = weights or {}
+        self._waiting = {}
+        self._vtime = {}
+        self._clock = 0.0
+        self._last_decrease = 0.0
+        OLLAMA_CONCURRENCY_LIMIT.set(int(self.limit))
+
+    def waiting(self, lane: str) -> int:
+        return len(self._waiting.get(lane, ()))
+
+    async def acquire(self, lane: str = "default"):
+        if self.in_flight < int(self.limit) and not any(self._waiting.values()):
+            self._grant(lane)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._waiting.setdefault(lane, deque())
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но ждавший отменён — возвращаем слот
+                self.in_flight -= 1
+                self._dispatch()
+            elif future in queue:
+                queue.remove(future)
+            raise
+
+    async def release(self, latency_ms: float, ok):
+        """Освободить слот; ok=None — запрос отменён, лимит не меняется"""
+        self.in_flight -= 1
+        if ok is not None:
+            self._adjust(latency_ms, ok)
+        self._dispatch()
+
+    def _grant(self, lane: str):
+        self.in_flight += 1
+        # Полоса, простаивавшая какое-то время, не копит кредит: начинает с текущего времени
+        start = max(self._vtime.get(lane, 0.0), self._clock)
+        self._clock = start
+        self._vtime[lane] = start + 1 / self.weights.get(lane, 1.0)
+
+    def _dispatch(self):
+        while self.in_flight < int(self.limit):
+            lanes = [lane for lane, queue in self._waiting.items() if queue]
+            if not lanes:
+                return
+            lane = min(lanes, key=lambda l: max(self._vtime.get(l, 0.0), self._clock))
+            future = self._waiting[lane].popleft()
+            if future.done():
+                continue
+            self._grant(lane)
+            future.set_result(None)
+
+    def _adjust(self, latency_ms: float, ok: bool):
+        if not self.latency_slo_ms:
+            return
+        previous = int(self.limit)
+        if not ok or latency_ms > self.latency_slo_ms:
+            now = time.monotonic()
+            if now - self._last_decrease >= latency_ms / 1000:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+        if int(self.limit) != previous:
+            OLLAMA_CONCURRENCY_LIMIT.set(int(self.limit))
+            logger.info(f"🎚️ Ollama concurrency limit: {previous} → {int(self.limit)} (last latency {latency_ms:.0f} ms)")
+
+
+class CircuitBreaker:
+    """Автомат отключения LLM-бэкенда
+
+    После failure_threshold неудач подряд размыкается: запросы не отправляются,
+    а потребители ждут в wait_closed(). Пока разомкнут, раз в open_seconds
+    (с удвоением до max_open_seconds) выполняется пробный запрос probe();
+    первый успешный ответ снова замыкает цепь.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, probe, failure_threshold: int = 5, open_seconds: float = 10.0,
+                 max_open_seconds: float = 120.0):
+        self.probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self._closed = asyncio.Event()
+        self._closed.set()
+        self._probe_task = None
+
+    def allow(self) -> bool:
+        return self.state == self.CLOSED
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+    def record(self, ok: bool):
+        if ok:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+                self._closed.set()
+                logger.info("✅ Ollama is back, circuit closed")
+            return
+
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self._set_state(self.OPEN)
+        elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+            self._set_state(self.OPEN)
+            self._closed.clear()
+            logger.error(f"🔌 Circuit open after {self.failures} Ollama failures, pausing consumption")
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def _probe_loop(self):
+        delay = self.open_seconds
+        while self.state != self.CLOSED:
+            await asyncio.sleep(delay)
+            self._set_state(self.HALF_OPEN)
+            try:
+                await self.probe()
+            except Exception as e:
+                if self.state != self.CLOSED:
+                    self._set_state(self.OPEN)
+                    delay = min(delay * 2, self.max_open_seconds)
+                    logger.warning(f"⚠️ Probe failed ({e}), next probe in {delay:.0f} s")
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.set({self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[state])
+
@@ -0,0 +1,77 @@
+"""Выбор модели под документ: короткие тексты — маленькой модели, длинные и неясные — большой
+
+Маршруты задаются JSON-списком в MODEL_ROUTES и проверяются по порядку,
+первый подходящий выигрывает:
+    [{"model": "qwen2.5:1.5b", "max_tokens": 64, "languages": ["ru", "en"]},
+     {"model": "qwen2.5:1.5b", "lanes": ["bulk"], "max_tokens": 256}]
+Все условия маршрута необязательны. Если ни один не подошёл — модель по умолчанию.
+"""
+import json
+import logging
+import re
+
+from chunking import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_CYRILLIC = re.compile(r"[а-яё]", re.IGNORECASE)
+_LATIN = re.compile(r"[a-z]", re.IGNORECASE)
+
+# Для определения языка хватает начала текста
+LANGUAGE_SAMPLE_CHARS = 500
+
+
+def detect_language(text: str) -> str:
+    """Грубое определение языка по алфавиту: ru, en или other"""
+    sample = text[:LANGUAGE_SAMPLE_CHARS]
+    cyrillic = len(_CYRILLIC.findall(sample))
+    latin = len(_LATIN.findall(sample))
+    if not cyrillic and not latin:
+        return "other"
+    return "ru" if cyrillic >= latin else "en"
+
+
+class ModelRouter:
+    """Таблица маршрутов: (текст, полоса) → модель"""
+
+    def __init__(self, routes: list, default: str, chars_per_token: float = 3.0):
+        self.routes = routes
+        self.default = default
+        self.chars_per_token = chars_per_token
+
+    @classmethod
+    def from_json(cls, spec: str, default: str, chars_per_token: float = 3.0) -> "ModelRouter":
+        routes = json.loads(spec) if spec.strip() else []
+        for route in routes:
+            if "model" not in route:
+                raise ValueError(f"маршрут без model: {route}")
+        return cls(routes, default, chars_per_token)
+
+    @property
+    def models(self) -> list:
+        """Все модели маршрутов и модель по умолчанию, без повторов"""
+        return list(dict.fromkeys([route["model"] for route in self.routes] + [self.default]))
+
+    def pick(self, text: str, lane: str) -> str:
+        if not self.routes:
+            return self.default
+        tokens = estimate_tokens(text, self.chars_per_token)
+        language = None
+        for route in self.routes:
+            if "max_tokens" in route and tokens > route["max_tokens"]:
+                continue
+            if "min_tokens" in route and tokens < route["min_tokens"]:
+                continue
+            if "lanes" in route and lane not in route["lanes"]:
+                continue
+            if "languages" in route:
+                language = language or detect_language(text)
+                if language not in route["languages"]:
+                    continue
+            return route["model"]
+        return self.default
+
+    def describe(self) -> str:
+        rules = [f"{route['model']} if {', '.join(f'{k}={v}' for k, v in route.items() if k != 'model') or 'always'}"
+                 for route in self.routes]
+        return "; ".join(rules + [f"else {self.default}"])
@@ -0,0 +1,77 @@
+"""Запуск нескольких воркеров классификатора в одном контейнере
+
+Каждый воркер — отдельный процесс со своим event loop, подключением к NATS,
+пулом Postgres и клиентом Ollama. Документы между воркерами делит
+группа очереди NATS (QUEUE_GROUP) или общий durable-консьюмер JetStream.
+
+Лимиты OLLAMA_MAX_CONCURRENCY и MAX_IN_FLIGHT действуют на каждый воркер отдельно.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("runner")
+
+WORKERS = int(os.getenv("WORKERS", "1"))
+# Пауза перед перезапуском упавшего воркера
+WORKER_RESTART_DELAY = float(os.getenv("WORKER_RESTART_DELAY", "1"))
+# Сколько ждать воркеры после SIGTERM
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+
+
+def run_worker(index: int):
+    os.environ["WORKER_ID"] = str(index)
+    import main
+
+    asyncio.run(main.main())
+
+
+def supervise(workers: int):
+    ctx = multiprocessing.get_context("spawn")
+    processes = {}
+    stopping = False
+
+    def start(index: int):
+        process = ctx.Process(target=run_worker, args=(index,), name=f"classifier-{index}")
+        process.start()
+        processes[index] = process
+        logger.info(f"🚀 Worker {index} started (pid {process.pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(workers):
+        start(index)
+
+    while not stopping:
+        time.sleep(1)
+        for index, process in list(processes.items()):
+            if not stopping and not process.is_alive():
+                logger.warning(f"⚠️ Worker {index} exited with code {process.exitcode}, restarting")
+                time.sleep(WORKER_RESTART_DELAY)
+                start(index)
+
+    logger.info("🛑 Stopping workers...")
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    for process in processes.values():
+        process.join(timeout=max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+
+
+if __name__ == "__main__":
+    if WORKERS <= 1:
+        run_worker(0)
+    else:
+        supervise(WORKERS)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import BATCH_TEXTS, ENCODE_SECONDS, ERRORS, QUEUE_DEPTH, THROUGHPUT
+
+logger = logging.getLogger(__name__)
+
+
+def size_bucket(size: int) -> str:
+    """Ближайшая сверху степень двойки — метка метрик без роста кардинальности"""
+    return str(1 << (size - 1).bit_length())
+
+
+class EmbeddingBatcher:
+    """Очередь текстов на эмбеддинг: пачка до max_size текстов или max_wait_ms ожидания
+
+    Кодирование идёт в отдельном потоке, чтобы цикл событий продолжал
+    принимать сообщения; пачки кодируются по одной, потому что прямой проход
+    сам занимает все ядра. Если в очереди накопилось больше max_size текстов,
+    забирается до max_size * sort_window: движок сортирует их по длине и
+    кодирует проходами по max_size, так что короткие тексты не добиваются
+    паддингом до длинных.
+    """
+
+    def __init__(self, encode, max_size: int = 64, max_wait_ms: int = 10, sort_window: int = 4):
+        self.encode = encode
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait_ms / 1000
+        self.sort_window = max(1, sort_window)
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+        self._task = None
+        # Статистика: {размер пачки (степень двойки): (текстов, секунд)}
+        self.totals = {}
+        QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=True)
+        for size, (texts, seconds) in sorted(self.totals.items(), key=lambda item: int(item[0])):
+            logger.info(f"📊 Batch ≤{size}: {texts} texts, {texts / seconds:.1f} texts/s")
+
+    async def submit(self, text: str):
+        """Поставить текст в очередь и дождаться его вектора"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Под нагрузкой забираем то, что уже ждёт, — до sort_window проходов
+        limit = self.max_size * self.sort_window
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+            started = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(self._executor, self.encode, texts)
+            except Exception as e:
+                ERRORS.labels("encode").inc()
+                logger.error(f"❌ Ошибка кодирования пачки из {len(texts)}: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            elapsed = time.perf_counter() - started
+            self._observe(len(texts), elapsed)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def _observe(self, size: int, elapsed: float):
+        bucket = size_bucket(size)
+        texts, seconds = self.totals.get(bucket, (0, 0.0))
+        self.totals[bucket] = (texts + size, seconds + elapsed)
+        BATCH_TEXTS.observe(size)
+        ENCODE_SECONDS.labels(bucket).observe(elapsed)
+        THROUGHPUT.labels(bucket).set(size / elapsed if elapsed > 0 else 0)
+        logger.info(f"🧮 Пачка из {size}: {elapsed * 1000:.1f} ms, {size / max(elapsed, 1e-9):.0f} texts/s")
@@ -0,0 +1,280 @@
+"""Движок эмбеддингов на CPU: токенизация, прямой проход трансформера, mean pooling
+
+Пачка текстов сортируется по длине и режется на проходы по batch_size,
+чтобы в одном проходе оказывались тексты близкой длины и паддинга было мало.
+Результат возвращается в исходном порядке.
+
+Бэкенды: torch — эталонный PyTorch eager, onnx — ONNX Runtime (в том числе
+модель с int8-квантованием весов). Экспорт, сверка и замер:
+    python engine.py export --out models/model.onnx --quantize
+    python engine.py parity --onnx models/model-int8.onnx
+    python engine.py bench --backend onnx --onnx models/model-int8.onnx --sizes 1,8,32,64
+"""
+import abc
+import argparse
+import logging
+import os
+import resource
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEngine(abc.ABC):
+    """Общая часть движков: токенизатор, сортировка по длине и pooling
+
+    Наследник реализует _forward(input_ids, attention_mask) и возвращает
+    последний скрытый слой (batch, tokens, dim) в виде numpy.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 64, max_length: int = 256, normalize: bool = True):
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self.normalize = normalize
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.dimension = None
+
+    @abc.abstractmethod
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Последний скрытый слой (batch, tokens, dim) для пачки токенов"""
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Эмбеддинги (len(texts), dimension) float32 в порядке texts"""
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        vectors = None
+        for start in range(0, len(texts), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            batch = self._encode_pass([texts[i] for i in indices])
+            if vectors is None:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[indices] = batch
+        return vectors if vectors is not None else np.zeros((0, self.dimension or 0), dtype=np.float32)
+
+    def _encode_pass(self, texts: list) -> np.ndarray:
+        """Один прямой проход: паддинг только до самого длинного текста прохода"""
+        tokens = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length,
+                                return_tensors="np")
+        mask = tokens["attention_mask"].astype(np.int64)
+        hidden = self._forward(tokens["input_ids"].astype(np.int64), mask)
+
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        self.dimension = pooled.shape[1]
+        return pooled.astype(np.float32, copy=False)
+
+
+class TorchEngine(EmbeddingEngine):
+    """Эталонный движок: модель transformers в PyTorch eager на CPU"""
+
+    def __init__(self, model_name: str, batch_size: int = 64, max_length: int = 256, normalize: bool = True,
+                 threads: int = 0):
+        super().__init__(model_name, batch_size, max_length, normalize)
+        import torch
+        from transformers import AutoModel
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self._torch = torch
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self.dimension = self.model.config.hidden_size
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        torch = self._torch
+        with torch.inference_mode():
+            output = self.model(input_ids=torch.from_numpy(input_ids),
+                                attention_mask=torch.from_numpy(attention_mask))
+        return output.last_hidden_state.numpy()
+
+
+class OnnxEngine(EmbeddingEngine):
+    """Движок на ONNX Runtime
+
+    Модель — результат export_onnx (fp32 или int8). intra_op_threads — потоки
+    внутри одного оператора, inter_op_threads — между независимыми операторами;
+    0 оставляет выбор за ONNX Runtime.
+    """
+
+    def __init__(self, model_name: str, onnx_path: str, batch_size: int = 64, max_length: int = 256,
+                 normalize: bool = True, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        super().__init__(model_name, batch_size, max_length, normalize)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        dimension = self.session.get_outputs()[0].shape[-1]
+        self.dimension = dimension if isinstance(dimension, int) else None
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        return self.session.run(None, feed)[0]
+
+
+def create_engine(backend: str, model_name: str, batch_size: int = 64, max_length: int = 256,
+                  onnx_path: str = "", threads: int = 0, inter_op_threads: int = 0) -> EmbeddingEngine:
+    """Движок по имени бэкенда: torch или onnx"""
+    if backend == "onnx":
+        return OnnxEngine(model_name, onnx_path, batch_size=batch_size, max_length=max_length,
+                          intra_op_threads=threads, inter_op_threads=inter_op_threads)
+    if backend == "torch":
+        return TorchEngine(model_name, batch_size=batch_size, max_length=max_length, threads=threads)
+    raise ValueError(f"неизвестный бэкенд эмбеддингов: {backend}")
+
+
+def max_rss_mb() -> float:
+    """Пиковый RSS процесса в МиБ (Linux отдаёт ru_maxrss в КиБ)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export_onnx(model_name: str, out: str, quantize: bool = False, opset: int = 17) -> str:
+    """Экспортировать модель в ONNX; с quantize — ещё и int8-версию весов рядом
+
+    Возвращает путь к итоговой модели (*-int8.onnx при quantize).
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    sample = tokenizer(["пример текста для экспорта"], return_tensors="pt")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            out,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "tokens"},
+                "attention_mask": {0: "batch", 1: "tokens"},
+                "last_hidden_state": {0: "batch", 1: "tokens"},
+            },
+            opset_version=opset,
+        )
+    logger.info(f"💾 ONNX fp32: {out} ({os.path.getsize(out) / 2 ** 20:.1f} MiB)")
+    if not quantize:
+        return out
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized = out.replace(".onnx", "-int8.onnx")
+    quantize_dynamic(out, quantized, weight_type=QuantType.QInt8)
+    logger.info(f"💾 ONNX int8: {quantized} ({os.path.getsize(quantized) / 2 ** 20:.1f} MiB)")
+    return quantized
+
+
+def parity(reference: EmbeddingEngine, candidate: EmbeddingEngine, texts: list) -> dict:
+    """Сверка двух движков на одних текстах
+
+    Косинус между векторами одного текста и доля текстов, у которых
+    ближайший сосед по обоим движкам совпадает (то, что важно для поиска).
+    """
+    a = reference.encode(texts)
+    b = candidate.encode(texts)
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+    def nearest(vectors):
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, -np.inf)
+        return similarity.argmax(axis=1)
+
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "neighbour_agreement": float((nearest(a) == nearest(b)).mean()) if len(texts) > 1 else 1.0,
+    }
+
+
+def sample_texts(count: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    words = "заметка идея задача вопрос проект встреча документ граф связь поиск текст модель".split()
+    return [" ".join(rng.choice(words, size=int(rng.integers(3, 60)))) for _ in range(count)]
+
+
+def export(args):
+    export_onnx(args.model, args.out, quantize=args.quantize, opset=args.opset)
+
+
+def check_parity(args):
+    texts = read_texts(args.texts) if args.texts else sample_texts(256)
+    reference = TorchEngine(args.model, max_length=args.max_length)
+    candidate = OnnxEngine(args.model, args.onnx, max_length=args.max_length)
+    report = parity(reference, candidate, texts)
+    print(f"min cosine {report['min_cosine']:.5f}, mean cosine {report['mean_cosine']:.5f}, "
+          f"nearest-neighbour agreement {report['neighbour_agreement']:.3f}")
+    if report["min_cosine"] < args.min_cosine:
+        raise SystemExit(f"Расхождение с эталоном: min cosine {report['min_cosine']:.5f} < {args.min_cosine}")
+
+
+def read_texts(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def bench(args):
+    engine = create_engine(args.backend, args.model, batch_size=max(args.sizes), max_length=args.max_length,
+                           onnx_path=args.onnx, threads=args.threads, inter_op_threads=args.inter_op_threads)
+    texts = sample_texts(args.texts)
+    engine.encode(texts[:max(args.sizes)])  # прогрев
+    print(f"{args.backend}: peak RSS after warm-up {max_rss_mb():.0f} MiB")
+
+    for size in args.sizes:
+        started = time.perf_counter()
+        for start in range(0, len(texts), size):
+            engine.encode(texts[start:start + size])
+        elapsed = time.perf_counter() - started
+        print(f"batch {size:4d}: {len(texts) / elapsed:8.1f} texts/s, {elapsed / len(texts) * 1000:.2f} ms/text")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Движок эмбеддингов")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    default_model = os.getenv("MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+    default_onnx = os.getenv("ONNX_MODEL", "models/model-int8.onnx")
+
+    export_parser = commands.add_parser("export", help="Экспортировать модель в ONNX")
+    export_parser.add_argument("--model", default=default_model)
+    export_parser.add_argument("--out", default="models/model.onnx")
+    export_parser.add_argument("--quantize", action="store_true", help="Дополнительно сохранить int8-модель")
+    export_parser.add_argument("--opset", type=int, default=17)
+    export_parser.set_defaults(func=export)
+
+    parity_parser = commands.add_parser("parity", help="Сверить ONNX-модель с эталоном PyTorch")
+    parity_parser.add_argument("--model", default=default_model)
+    parity_parser.add_argument("--onnx", default=default_onnx)
+    parity_parser.add_argument("--texts", help="Файл с текстами, по одному на строку")
+    parity_parser.add_argument("--max-length", type=int, default=256)
+    parity_parser.add_argument("--min-cosine", type=float, default=0.98)
+    parity_parser.set_defaults(func=check_parity)
+
+    bench_parser = commands.add_parser("bench", help="Пропускная способность по размерам пачки")
+    bench_parser.add_argument("--backend", choices=["torch", "onnx"], default=os.getenv("EMBED_BACKEND", "torch"))
+    bench_parser.add_argument("--model", default=default_model)
+    bench_parser.add_argument("--onnx", default=default_onnx)
+    bench_parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[1, 8, 32, 64])
+    bench_parser.add_argument("--texts", type=int, default=512)
+    bench_parser.add_argument("--max-length", type=int, default=256)
+    bench_parser.add_argument("--threads", type=int, default=0)
+    bench_parser.add_argument("--inter-op-threads", type=int, default=0)
+    bench_parser.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,51 @@
+"""Метрики эмбеддера в формате Prometheus (GET http://<host>:METRICS_PORT/metrics)"""
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Границы от долей миллисекунды до десятков секунд
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "embedder_stage_seconds",
+    "Время этапов обработки сообщения",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+MESSAGES_IN = Counter("embedder_messages_in_total", "Получено сообщений document.classified")
+MESSAGES_OUT = Counter("embedder_messages_out_total", "Опубликовано сообщений document.embedded")
+ERRORS = Counter("embedder_errors_total", "Ошибки обработки", ["stage"])
+
+IN_FLIGHT = Gauge("embedder_in_flight", "Сообщений в обработке")
+PENDING_MESSAGES = Gauge("embedder_subscription_pending_messages", "Сообщений в буфере подписки NATS")
+PENDING_BYTES = Gauge("embedder_subscription_pending_bytes", "Байт в буфере подписки NATS")
+QUEUE_DEPTH = Gauge("embedder_queue_depth", "Текстов в очереди на кодирование")
+
+BATCH_TEXTS = Histogram("embedder_batch_texts", "Текстов в одной пачке кодирования",
+                        buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+ENCODE_SECONDS = Histogram("embedder_encode_seconds", "Время кодирования пачки", ["batch_size"],
+                           buckets=LATENCY_BUCKETS)
+CACHE_HITS = Counter("embedder_cache_hits_total", "Векторов, найденных в кэше")
+CACHE_MISSES = Counter("embedder_cache_misses_total", "Промахов кэша векторов")
+CACHE_COMPACTIONS = Counter("embedder_cache_compactions_total", "Сжатий кэша векторов")
+CACHE_ROWS = Gauge("embedder_cache_vectors", "Векторов в кэше")
+THROUGHPUT = Gauge("embedder_throughput_texts_per_second", "Текстов в секунду на последней пачке", ["batch_size"])
+DB_ROWS = Counter("embedder_db_rows_total", "Векторов в таблице эмбеддингов по исходу записи", ["result"])
+DB_FLUSH_SECONDS = Histogram("embedder_db_flush_seconds", "Время записи пачки векторов в Postgres",
+                             buckets=LATENCY_BUCKETS)
+
+
+def watch_subscription(sub):
+    """Отдавать размер буфера подписки при каждом чтении метрик"""
+    PENDING_MESSAGES.set_function(lambda: sub.pending_msgs)
+    PENDING_BYTES.set_function(lambda: sub.pending_bytes)
+
+
+def start_metrics_server(port: int):
+    if port <= 0:
+        return
+    start_http_server(port)
+    logger.info(f"📊 Metrics on :{port}/metrics")
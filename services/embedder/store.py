@@ -0,0 +1,133 @@
+"""Таблица эмбеддингов в Postgres (pgvector)
+
+Векторы пишут и сервис (каждый опубликованный document.embedded), и backfill.py.
+Линкер при старте загружает таблицу в свои индексы (EMBEDDINGS_TABLE), поэтому
+после перезапуска ему не нужны повторные события по старым документам.
+"""
+import asyncio
+import logging
+import time
+import uuid
+
+import asyncpg
+import numpy as np
+
+from metrics import DB_FLUSH_SECONDS, DB_ROWS, ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+def vector_literal(vector) -> str:
+    return "[" + ",".join(f"{x:.7g}" for x in vector) + "]"
+
+
+async def prepare_table(conn, table: str, dimension: int):
+    """Создать расширение pgvector и таблицу эмбеддингов, если их нет"""
+    await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    await conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            document_id uuid NOT NULL,
+            model text NOT NULL,
+            embedding vector({dimension}) NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (document_id, model)
+        )
+    """)
+
+
+async def write_vectors(conn, table: str, model: str, ids: list, vectors: np.ndarray):
+    """COPY во временную таблицу и upsert: повтор после сбоя не создаёт дубликатов
+
+    id в пачке должны быть уникальны: ON CONFLICT DO UPDATE не меняет строку дважды.
+    """
+    records = [(document_id, model, vector_literal(vector)) for document_id, vector in zip(ids, vectors)]
+    async with conn.transaction():
+        await conn.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {table}_incoming
+            (document_id uuid, model text, embedding text) ON COMMIT DELETE ROWS
+        """)
+        await conn.copy_records_to_table(f"{table}_incoming", records=records)
+        await conn.execute(f"""
+            INSERT INTO {table} (document_id, model, embedding)
+            SELECT document_id, model, embedding::vector FROM {table}_incoming
+            ON CONFLICT (document_id, model) DO UPDATE
+            SET embedding = EXCLUDED.embedding, created_at = now()
+        """)
+
+
+class EmbeddingWriter:
+    """Отложенная запись векторов сервиса пачками
+
+    Векторы копятся в буфере (по document_id — повтор документа заменяет вектор)
+    и сбрасываются, когда их набралось batch_size или прошло flush_interval_ms.
+    Пачка, которую не удалось записать, и векторы сверх max_buffer, пока база
+    недоступна, отбрасываются и учитываются в метрике: их дозапишет backfill.py.
+    """
+
+    def __init__(self, dsn: str, table: str, model: str, batch_size: int = 256,
+                 flush_interval_ms: int = 500, max_buffer: int = 10000):
+        self.dsn = dsn
+        self.table = table
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self.pool = None
+        self._buffer = {}
+        self._full = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+    async def start(self, dimension: int):
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=2)
+        async with self.pool.acquire() as conn:
+            await prepare_table(conn, self.table, dimension)
+        self._task = asyncio.create_task(self._run())
+
+    def add(self, document_id, vector):
+        try:
+            key = str(uuid.UUID(str(document_id)))
+        except ValueError:
+            logger.warning(f"⚠️ document_id {document_id!r} не UUID, вектор в {self.table} не сохраняется")
+            return
+        self._buffer.pop(key, None)
+        self._buffer[key] = vector
+        while len(self._buffer) > self.max_buffer:
+            del self._buffer[next(iter(self._buffer))]
+            DB_ROWS.labels("dropped").inc()
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+        await self.flush()
+
+    async def flush(self):
+        while self._buffer:
+            ids = list(self._buffer)[:self.batch_size]
+            vectors = [self._buffer.pop(document_id) for document_id in ids]
+            started = time.perf_counter()
+            try:
+                async with self.pool.acquire() as conn:
+                    await write_vectors(conn, self.table, self.model, ids, vectors)
+            except Exception as e:
+                ERRORS.labels("db").inc()
+                DB_ROWS.labels("failed").inc(len(ids))
+                logger.error(f"❌ Не удалось сохранить {len(ids)} векторов в {self.table}: {e}")
+                return
+            DB_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            DB_ROWS.labels("written").inc(len(ids))
+
+    async def close(self):
+        self._closing = True
+        self._full.set()
+        if self._task is not None:
+            await self._task
+        if self.pool is not None:
+            await self.pool.close()
@@ -0,0 +1,223 @@
+"""Постоянный кэш эмбеддингов: хэш (модель, вариант, текст) → вектор float16
+
+Вариант — всё остальное, от чего зависит вектор: бэкенд, файл ONNX (fp32 или
+int8) и длина обрезки; векторы разных вариантов живут в одном кэше под разными ключами.
+Хранилище — два файла в каталоге поколения gen-<N>, отображённые в память:
+    vectors.f16 — матрица (max_rows, dim) float16, строки только дописываются
+    keys.u64    — 64-битный хэш ключа для каждой строки (0 — строка пуста)
+Текущее поколение записано в meta.json. Сжатие пишет новое поколение целиком
+и переключается на него одной атомарной заменой meta.json, поэтому сбой на любом
+шаге оставляет на диске согласованную пару файлов.
+Индекс — отсортированный массив хэшей с номерами строк (12 байт на запись)
+плюс небольшой словарь недавно добавленных ключей, который периодически
+вливается в отсортированный массив. Найденный вектор — срез отображённого
+файла, без копирования; после перезапуска кэш читается с диска.
+
+Писатель один (поток кодирования), читатели — цикл событий. Изменения,
+которые затрагивают несколько массивов, публикуются заменой одного объекта
+состояния, поэтому читателю блокировки не нужны.
+Когда файл заполнен, выполняется сжатие: остаются keep_fraction строк
+с самым поздним обращением.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from metrics import CACHE_COMPACTIONS, CACHE_HITS, CACHE_MISSES, CACHE_ROWS
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(model: str, text: str, variant: str = "") -> int:
+    digest = hashlib.blake2b(f"{model}\0{variant}\0{text}".encode(), digest_size=8).digest()
+    # Нулевой ключ зарезервирован под пустую строку
+    return int.from_bytes(digest, "little") | 1
+
+
+@dataclass
+class _State:
+    vectors: np.ndarray
+    keys: np.ndarray
+    sorted_keys: np.ndarray
+    sorted_rows: np.ndarray
+    recent: dict = field(default_factory=dict)
+    count: int = 0
+
+
+class VectorCache:
+    """Кэш векторов одной модели размерности dimension, не больше max_mb на диске"""
+
+    def __init__(self, path: str, model: str, dimension: int, max_mb: int = 1024,
+                 keep_fraction: float = 0.5, merge_every: int = 65536, variant: str = ""):
+        self.path = path
+        self.model = model
+        self.variant = variant
+        self.dimension = dimension
+        self.max_rows = max(1, max_mb * 2 ** 20 // (dimension * 2 + 8))
+        self.keep_fraction = keep_fraction
+        self.merge_every = merge_every
+        # Время последнего обращения к строке (в тиках), для вытеснения при сжатии
+        self._last_used = np.zeros(self.max_rows, dtype=np.uint32)
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+        self._state = None
+        self.generation = 0
+
+    @property
+    def count(self) -> int:
+        return self._state.count if self._state is not None else 0
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        layout = {"dimension": self.dimension, "max_rows": self.max_rows}
+        meta = {}
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        self.generation = meta.get("generation", 0)
+        files = [os.path.join(self._generation_dir(self.generation), name) for name in ("vectors.f16", "keys.u64")]
+        reset = not meta or not all(os.path.exists(name) for name in files)
+        if meta and {key: meta.get(key) for key in layout} != layout:
+            logger.warning(f"⚠️ Embedding cache layout changed, starting empty: {self.path}")
+            reset = True
+        if reset:
+            # Новое поколение, чтобы не писать поверх файлов, на которые ещё указывает meta.json
+            self.generation += 1
+            os.makedirs(self._generation_dir(self.generation), exist_ok=True)
+            vectors, keys = self._map(mode="w+")
+            self._switch(layout)
+        else:
+            vectors, keys = self._map(mode="r+")
+        # Поколения, недописанные при сбое во время сжатия, и старые файлы до перехода на поколения
+        self._remove_stale()
+
+        count = int(np.count_nonzero(keys))
+        self._last_used[:count] = np.arange(count, dtype=np.uint32)
+        self._tick = count
+        self._state = self._indexed(vectors, keys, count)
+        CACHE_ROWS.set_function(lambda: self.count)
+        logger.info(f"✅ Embedding cache: {count} vectors in {self.path} (capacity {self.max_rows})")
+
+    def close(self):
+        if self._state is not None:
+            self._state.vectors.flush()
+            self._state.keys.flush()
+        total = self.hits + self.misses
+        logger.info(f"🛑 Embedding cache: {self.count} vectors, hit rate "
+                    f"{self.hits / total if total else 0:.1%} ({self.hits}/{total})")
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.path, f"gen-{generation}")
+
+    def _map(self, mode: str, generation: int = None):
+        directory = self._generation_dir(self.generation if generation is None else generation)
+        vectors = np.memmap(os.path.join(directory, "vectors.f16"), dtype=np.float16, mode=mode,
+                            shape=(self.max_rows, self.dimension))
+        keys = np.memmap(os.path.join(directory, "keys.u64"), dtype=np.uint64, mode=mode,
+                         shape=(self.max_rows,))
+        return vectors, keys
+
+    def _switch(self, layout: dict = None):
+        """Сделать self.generation текущим поколением: запись во временный файл и rename"""
+        layout = layout or {"dimension": self.dimension, "max_rows": self.max_rows}
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(dict(layout, generation=self.generation), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _remove_stale(self):
+        current = f"gen-{self.generation}"
+        for name in os.listdir(self.path):
+            stale = os.path.join(self.path, name)
+            if name.startswith("gen-") and name != current:
+                shutil.rmtree(stale, ignore_errors=True)
+            elif name in ("vectors.f16", "keys.u64", "vectors.f16.tmp", "keys.u64.tmp"):
+                os.remove(stale)
+
+    @staticmethod
+    def _indexed(vectors, keys, count: int) -> _State:
+        order = np.argsort(keys[:count], kind="stable")
+        return _State(vectors, keys, np.asarray(keys[:count])[order], order.astype(np.uint32), {}, count)
+
+    def _row(self, state: _State, key: int):
+        row = state.recent.get(key)
+        if row is not None:
+            return row
+        i = int(np.searchsorted(state.sorted_keys, np.uint64(key)))
+        if i < len(state.sorted_keys) and state.sorted_keys[i] == key:
+            return int(state.sorted_rows[i])
+        return None
+
+    def get(self, text: str):
+        """Вектор float16 (срез файла) или None"""
+        state = self._state
+        row = self._row(state, content_key(self.model, text, self.variant))
+        if row is None:
+            self.misses += 1
+            CACHE_MISSES.inc()
+            return None
+        self.hits += 1
+        CACHE_HITS.inc()
+        self._tick += 1
+        self._last_used[row] = self._tick
+        return state.vectors[row]
+
+    def put_many(self, texts: list, vectors: np.ndarray):
+        """Дописать векторы; вызывается только из потока кодирования"""
+        for text, vector in zip(texts, vectors):
+            key = content_key(self.model, text, self.variant)
+            state = self._state
+            if self._row(state, key) is not None:
+                continue
+            if state.count >= self.max_rows:
+                self.compact()
+                state = self._state
+            row = state.count
+            state.vectors[row] = vector
+            # Ключ пишется после вектора: непустой ключ означает записанную строку
+            state.keys[row] = key
+            self._tick += 1
+            self._last_used[row] = self._tick
+            state.recent[key] = row
+            state.count += 1
+
+        if len(self._state.recent) >= self.merge_every:
+            self._state = self._indexed(self._state.vectors, self._state.keys, self._state.count)
+
+    def compact(self):
+        """Оставить keep_fraction самых свежих по обращению строк в новом поколении файлов"""
+        started = time.perf_counter()
+        state = self._state
+        keep = max(1, int(self.max_rows * self.keep_fraction))
+        rows = np.sort(np.argsort(self._last_used[:state.count], kind="stable")[-keep:])
+
+        generation = self.generation + 1
+        os.makedirs(self._generation_dir(generation), exist_ok=True)
+        vectors, keys = self._map(mode="w+", generation=generation)
+        vectors[:len(rows)] = state.vectors[rows]
+        keys[:len(rows)] = state.keys[rows]
+        vectors.flush()
+        keys.flush()
+        # Единственный шаг переключения; до него на диске действует прежнее поколение
+        self.generation = generation
+        self._switch()
+        # Старое поколение ещё отображено в state: на Linux удаление файлов этому не мешает
+        self._remove_stale()
+
+        last_used = self._last_used[rows]
+        self._last_used[:] = 0
+        self._last_used[:len(rows)] = last_used
+        self._state = self._indexed(vectors, keys, len(rows))
+        CACHE_COMPACTIONS.inc()
+        logger.info(f"🗜️ Embedding cache compacted: {state.count} → {len(rows)} vectors "
+                    f"in {time.perf_counter() - started:.1f} s")
@@ -0,0 +1,102 @@
+"""Формат события document.embedded: бинарный конверт с JSON-запасным вариантом
+
+Бинарный конверт:
+    b"HVE1" | длина заголовка (uint16 LE) | заголовок JSON | выравнивание до 4 байт | вектор
+Заголовок: document_id, model, dim, dtype ("float32" или "float16") и прочие поля.
+Вектор — dim чисел little-endian; получатель читает его через numpy.frombuffer
+без копирования. JSON-вариант ({..., "embedding": [...]}) оставлен для отладки;
+decode различает форматы по первым байтам.
+
+Контракт — contracts/events/document-embedded.yaml. Модуль одинаковой копией
+лежит в embedder и linker (у каждого сервиса свой образ): меняя формат, обновите
+обе копии, контракт и CONTRACT_VERSION. Отправитель пишет версию в заголовок,
+получатель отвергает событие другой старшей версии, а не читает его наугад.
+
+Сравнение размера и скорости форматов:
+    python vector_codec.py bench --dim 384
+"""
+import argparse
+import json
+import struct
+import time
+
+import numpy as np
+
+# Версия контракта document.embedded, которую реализует модуль
+CONTRACT_VERSION = "1.2.0"
+MAGIC = b"HVE1"
+DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+_PREFIX = struct.Struct("<4sH")
+
+
+def _check_version(header: dict):
+    """Событие без версии — от отправителя до её появления, читается как 1.x"""
+    version = str(header.get("version", CONTRACT_VERSION))
+    if version.split(".")[0] != CONTRACT_VERSION.split(".")[0]:
+        raise ValueError(f"document.embedded версии {version} несовместимо с {CONTRACT_VERSION} "
+                         f"(contracts/events/document-embedded.yaml)")
+
+
+def encode(header: dict, vector: np.ndarray, wire_format: str = "binary", dtype: str = "float32") -> bytes:
+    header = dict(header, version=CONTRACT_VERSION)
+    if wire_format == "json":
+        return json.dumps(dict(header, embedding=np.asarray(vector, dtype=np.float32).tolist(),
+                               dimension=len(vector))).encode()
+
+    meta = json.dumps(dict(header, dim=len(vector), dtype=dtype), separators=(",", ":")).encode()
+    padding = -(_PREFIX.size + len(meta)) % 4
+    body = np.ascontiguousarray(vector, dtype=DTYPES[dtype]).tobytes()
+    return b"".join((_PREFIX.pack(MAGIC, len(meta) + padding), meta, b" " * padding, body))
+
+
+def decode(payload: bytes) -> tuple[dict, np.ndarray]:
+    """(заголовок, вектор); для бинарного конверта вектор — представление payload без копии"""
+    if payload[:4] != MAGIC:
+        if payload[:3] == MAGIC[:3]:
+            raise ValueError(f"Неизвестная версия конверта {bytes(payload[:4])!r}, ожидается {MAGIC!r}")
+        data = json.loads(payload)
+        _check_version(data)
+        vector = np.asarray(data.pop("embedding"), dtype=np.float32)
+        data.setdefault("dim", len(vector))
+        return data, vector
+
+    _, meta_length = _PREFIX.unpack_from(payload)
+    offset = _PREFIX.size + meta_length
+    header = json.loads(bytes(payload[_PREFIX.size:offset]))
+    _check_version(header)
+    vector = np.frombuffer(payload, dtype=DTYPES[header["dtype"]], count=header["dim"], offset=offset)
+    return header, vector
+
+
+def bench(args):
+    rng = np.random.default_rng(0)
+    vector = rng.normal(size=args.dim).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    header = {"document_id": "123e4567-e89b-12d3-a456-426614174000",
+              "model": "sentence-transformers/all-MiniLM-L6-v2", "tags": ["идея"]}
+
+    for wire_format, dtype in (("json", "float32"), ("binary", "float32"), ("binary", "float16")):
+        payload = encode(header, vector, wire_format, dtype)
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            encode(header, vector, wire_format, dtype)
+        encode_us = (time.perf_counter() - started) / args.rounds * 1e6
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            decode(payload)
+        decode_us = (time.perf_counter() - started) / args.rounds * 1e6
+        error = float(np.abs(decode(payload)[1].astype(np.float32) - vector).max())
+        print(f"{wire_format:6s} {dtype:7s}: {len(payload):6d} bytes, encode {encode_us:7.1f} us, "
+              f"decode {decode_us:7.1f} us, max error {error:.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Формат события document.embedded")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench_parser = commands.add_parser("bench", help="Размер и скорость JSON и бинарного конверта")
+    bench_parser.add_argument("--dim", type=int, default=384)
+    bench_parser.add_argument("--rounds", type=int, default=10000)
+    bench_parser.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    args.func(args)
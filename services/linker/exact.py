@@ -0,0 +1,176 @@
+"""Точный поиск по косинусной близости: блочное умножение матриц и argpartition
+
+Векторы лежат в одной непрерывной матрице float32, нормированные при вставке,
+поэтому близость — просто скалярное произведение. Матрица растёт удвоением
+(амортизированно O(1) на вставку). Запрос или пачка запросов умножается на
+матрицу блоками строк; из каждого блока берутся k лучших через argpartition
+и сливаются с накопленными. Память на блок ограничена block_mb, поэтому на
+корпусе 1M×384 полная матрица оценок не создаётся.
+
+Подходит для небольших корпусов и как эталон для проверки точности HNSW:
+    python exact.py bench --n 1000000 --batch 64
+"""
+import argparse
+import time
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int, block_mb: int = 64) -> tuple:
+    """k лучших строк matrix для каждого запроса: (номера строк, близости), по убыванию
+
+    matrix и queries должны быть нормированы; размер (n_queries, block_rows)
+    промежуточной матрицы оценок не превышает block_mb.
+    """
+    queries = np.atleast_2d(queries)
+    n = len(matrix)
+    k = min(k, n)
+    if k <= 0:
+        empty = np.zeros((len(queries), 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    block_rows = max(k, block_mb * 2 ** 20 // (4 * len(queries)))
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, n, block_rows):
+        scores = queries @ matrix[start:start + block_rows].T
+        if scores.shape[1] > k:
+            rows = np.argpartition(scores, -k, axis=1)[:, -k:]
+            scores = np.take_along_axis(scores, rows, axis=1)
+        else:
+            rows = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        best_rows = np.concatenate((best_rows, rows + start), axis=1)
+        best_scores = np.concatenate((best_scores, scores), axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+class ExactIndex:
+    """Точный индекс векторов размерности dim с внешними id документов"""
+
+    def __init__(self, dim: int, capacity: int = 1024, block_mb: int = 64):
+        self.dim = dim
+        self.block_mb = block_mb
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = []
+        self._index = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._index
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Нормированные векторы всех вставленных документов (представление без копии)"""
+        return self._vectors[:len(self._ids)]
+
+    @property
+    def ids(self) -> list:
+        return self._ids
+
+    def position(self, doc_id):
+        """Номер строки документа в vectors или None"""
+        return self._index.get(doc_id)
+
+    def _reserve(self, count: int):
+        capacity = len(self._vectors)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:len(self._vectors)] = self._vectors
+        self._vectors = vectors
+
+    def add(self, doc_id, vector):
+        """Вставить документ; для уже известного id вектор заменяется"""
+        self.add_many([doc_id], np.asarray(vector)[None])
+
+    def add_many(self, doc_ids, vectors: np.ndarray):
+        rows = np.empty(len(vectors), dtype=np.int64)
+        for i, doc_id in enumerate(doc_ids):
+            row = self._index.get(doc_id)
+            if row is None:
+                row = self._index[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+            rows[i] = row
+        self._reserve(len(self._ids))
+        self._vectors[rows] = normalize(vectors)
+
+    def search(self, vector, k: int = 10, threshold: float = None, exclude=None) -> list:
+        """До k ближайших документов как [(doc_id, сходство)] по убыванию сходства"""
+        return self.search_batch(np.asarray(vector)[None], k, threshold,
+                                 None if exclude is None else [exclude])[0]
+
+    def search_batch(self, queries: np.ndarray, k: int = 10, threshold: float = None,
+                     exclude: list = None) -> list:
+        """search для пачки запросов одним проходом по матрице; exclude — id на каждый запрос"""
+        extra = 1 if exclude is not None else 0
+        rows, scores = top_k(self.vectors, normalize(queries), k + extra, self.block_mb)
+        results = []
+        for i, (query_rows, query_scores) in enumerate(zip(rows.tolist(), scores.tolist())):
+            found = []
+            for row, similarity in zip(query_rows, query_scores):
+                if threshold is not None and similarity < threshold:
+                    break
+                doc_id = self._ids[row]
+                if extra and doc_id == exclude[i]:
+                    continue
+                found.append((doc_id, similarity))
+                if len(found) == k:
+                    break
+            results.append(found)
+        return results
+
+
+def bench(args):
+    rng = np.random.default_rng(0)
+    index = ExactIndex(args.dim, block_mb=args.block_mb)
+    started = time.perf_counter()
+    # Пачками, чтобы генерация данных не требовала второй копии корпуса
+    for start in range(0, args.n, 100000):
+        count = min(100000, args.n - start)
+        index.add_many(range(start, start + count), rng.normal(size=(count, args.dim)).astype(np.float32))
+    print(f"load: {args.n}×{args.dim} in {time.perf_counter() - started:.1f} s "
+          f"({index._vectors.nbytes / 2 ** 20:.0f} MiB)")
+
+    queries = rng.normal(size=(args.batch, args.dim)).astype(np.float32)
+    started = time.perf_counter()
+    for query in queries[:args.single]:
+        index.search(query, args.k, threshold=args.threshold)
+    single = (time.perf_counter() - started) / args.single
+    started = time.perf_counter()
+    index.search_batch(queries, args.k, threshold=args.threshold)
+    batched = (time.perf_counter() - started) / len(queries)
+    print(f"single query: {single * 1000:.1f} ms, batch of {len(queries)}: {batched * 1000:.1f} ms per query "
+          f"({1 / batched:.0f} queries/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Точный поиск линкера")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench_parser = commands.add_parser("bench", help="Задержка одиночных и пакетных запросов")
+    bench_parser.add_argument("--n", type=int, default=200000)
+    bench_parser.add_argument("--dim", type=int, default=384)
+    bench_parser.add_argument("--k", type=int, default=100)
+    bench_parser.add_argument("--batch", type=int, default=64)
+    bench_parser.add_argument("--single", type=int, default=10)
+    bench_parser.add_argument("--threshold", type=float, default=None)
+    bench_parser.add_argument("--block-mb", type=int, default=64)
+    bench_parser.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    args.func(args)
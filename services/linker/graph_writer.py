@@ -0,0 +1,263 @@
+"""Пакетная запись связей в Neo4j: буфер, схлопывание повторов и UNWIND
+
+Связи документа не пишутся по одной (100 связей — 100 обращений по Bolt),
+а попадают в буфер. Буфер сбрасывается, когда набралось max_batch рёбер или
+прошло max_delay_ms с первого несброшенного. Сброс — одна транзакция на
+тип связи и пачку: параметризованный UNWIND $rows MERGE ... Запрос один и
+тот же, поэтому план кэшируется сервером.
+
+Повторы схлопываются ещё в буфере. Связь "similar" симметрична, поэтому
+(a, b) и (b, a) — одно ребро, и сохраняется последняя близость.
+
+Буфер ограничен max_buffer рёбрами: полный буфер задерживает add не дольше
+max_wait_ms, после чего самые старые рёбра отбрасываются (метрика
+linker_graph_edges_total{result="dropped"}). Так недоступный Neo4j не
+останавливает обработку событий, а теряются только связи в графе.
+
+Куда писать, решает приёмник с методом async write(link_type, rows).
+Neo4jSink пишет в базу через пул соединений драйвера, MemorySink держит
+рёбра в памяти. С MemorySink пропускную способность можно измерить без Neo4j:
+    python graph_writer.py bench --docs 2000 --latency-ms 2
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from metrics import LINK_BUFFER, LINK_EDGES, LINK_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Тип связи -> тип отношения в графе (тип отношения нельзя передать параметром)
+RELATIONSHIPS = {"similar": "SIMILAR", "tags": "SHARES_TAGS", "references": "REFERENCES", "opposite": "OPPOSITE"}
+# Связи, у которых направление не важно
+SYMMETRIC = {"similar", "tags", "opposite"}
+
+MERGE_QUERY = """
+UNWIND $rows AS row
+MERGE (a:Document {id: row.source})
+MERGE (b:Document {id: row.target})
+MERGE (a)-[r:%s]->(b)
+SET r.similarity = row.similarity, r.updated_at = timestamp()
+"""
+
+
+class Neo4jSink:
+    """Запись пачек в Neo4j через пул соединений асинхронного драйвера"""
+
+    def __init__(self, url: str, user: str, password: str, database: str = None, pool_size: int = 10):
+        from neo4j import AsyncGraphDatabase
+
+        self.driver = AsyncGraphDatabase.driver(url, auth=(user, password), max_connection_pool_size=pool_size)
+        self.database = database
+
+    async def start(self):
+        await self.driver.verify_connectivity()
+        # Без уникального индекса каждый MERGE по id — полный просмотр узлов
+        async with self.driver.session(database=self.database) as session:
+            await session.run("CREATE CONSTRAINT document_id IF NOT EXISTS "
+                              "FOR (d:Document) REQUIRE d.id IS UNIQUE")
+
+    async def write(self, link_type: str, rows: list):
+        query = MERGE_QUERY % RELATIONSHIPS[link_type]
+
+        async def work(tx):
+            result = await tx.run(query, rows=rows)
+            await result.consume()
+
+        async with self.driver.session(database=self.database) as session:
+            # execute_write повторяет транзакцию при временных ошибках кластера
+            await session.execute_write(work)
+
+    async def close(self):
+        await self.driver.close()
+
+
+class MemorySink:
+    """Приёмник в памяти с имитацией задержки сети и записи
+
+    latency_ms — на каждую пачку (обращение), row_us — на каждое ребро.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, row_us: float = 0.0):
+        self.latency_ms = latency_ms
+        self.row_us = row_us
+        self.edges = {}
+        self.batches = 0
+
+    async def start(self):
+        pass
+
+    async def write(self, link_type: str, rows: list):
+        await asyncio.sleep(self.latency_ms / 1000 + self.row_us * len(rows) / 1e6)
+        for row in rows:
+            self.edges[(link_type, row["source"], row["target"])] = row["similarity"]
+        self.batches += 1
+
+    async def close(self):
+        pass
+
+
+class LinkWriter:
+    """Буфер связей перед приёмником; сброс по размеру или по времени"""
+
+    def __init__(self, sink, max_batch: int = 5000, max_delay_ms: float = 100, max_buffer: int = 50000,
+                 max_wait_ms: float = 1000):
+        self.sink = sink
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        # Больше max_buffer рёбер add ждёт сброса: Neo4j не успевает — тормозим вход,
+        # но не дольше max_wait_ms, дальше отбрасываем самые старые рёбра
+        self.max_buffer = max_buffer
+        self.max_wait = max_wait_ms / 1000
+        self._buffer = {}
+        self._first_at = None
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._task = None
+        self._closing = False
+        self.added = 0
+        self.written = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    async def start(self):
+        await self.sink.start()
+        self._task = asyncio.create_task(self._run())
+        LINK_BUFFER.set_function(lambda: len(self._buffer))
+
+    async def add(self, source, links: list, link_type: str = "similar"):
+        """Поставить в очередь связи source -> [(target, similarity)]"""
+        deadline = time.monotonic() + self.max_wait
+        while len(self._buffer) >= self.max_buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._drop_oldest(len(self._buffer) - self.max_buffer + len(links))
+                break
+            self._wakeup.set()
+            self._drained.clear()
+            try:
+                await asyncio.wait_for(self._drained.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        for target, similarity in links:
+            a, b = source, target
+            if link_type in SYMMETRIC and str(b) < str(a):
+                a, b = b, a
+            self._buffer[(link_type, a, b)] = similarity
+        self.added += len(links)
+        if self._buffer and self._first_at is None:
+            # Первое ребро пачки: сбрасывателю пора завести таймер
+            self._first_at = time.monotonic()
+            self._wakeup.set()
+        if len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+
+    def _drop_oldest(self, count: int):
+        """Отбросить count рёбер, дольше всех ждущих записи"""
+        count = min(count, len(self._buffer))
+        for key in list(self._buffer)[:count]:
+            del self._buffer[key]
+        self.dropped += count
+        LINK_EDGES.labels("dropped").inc(count)
+        logger.warning(f"⚠️ Буфер связей полон дольше {self.max_wait * 1000:.0f} ms, "
+                       f"отброшено {count} самых старых рёбер")
+
+    async def _run(self):
+        while True:
+            timeout = None
+            if self._first_at is not None:
+                timeout = max(0.0, self._first_at + self.max_delay - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            due = self._first_at is not None and time.monotonic() >= self._first_at + self.max_delay
+            if self._buffer and (due or self._closing or len(self._buffer) >= self.max_batch
+                                 or not self._drained.is_set()):
+                await self._flush()
+                self._drained.set()
+            if self._closing and not self._buffer:
+                return
+
+    async def _flush(self):
+        buffer, self._buffer, self._first_at = self._buffer, {}, None
+        groups = {}
+        for (link_type, source, target), similarity in buffer.items():
+            groups.setdefault(link_type, []).append(
+                {"source": source, "target": target, "similarity": similarity})
+
+        for link_type, rows in groups.items():
+            for start in range(0, len(rows), self.max_batch):
+                chunk = rows[start:start + self.max_batch]
+                started = time.perf_counter()
+                try:
+                    await self.sink.write(link_type, chunk)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка записи связей ({len(chunk)}): {e}")
+                    LINK_EDGES.labels("failed").inc(len(chunk))
+                    if self._closing:
+                        continue
+                    # Вернуть в начало буфера (они старше всего, что пришло во время сброса),
+                    # не затирая более свежие значения тех же рёбер
+                    requeued = {(link_type, row["source"], row["target"]): row["similarity"] for row in chunk}
+                    requeued.update(self._buffer)
+                    self._buffer = requeued
+                    if self._first_at is None:
+                        self._first_at = time.monotonic()
+                    await asyncio.sleep(min(1.0, self.max_delay * 10))
+                    continue
+                LINK_FLUSH_SECONDS.observe(time.perf_counter() - started)
+                LINK_EDGES.labels("written").inc(len(chunk))
+                self.written += len(chunk)
+
+    async def close(self):
+        """Сбросить всё накопленное и закрыть приёмник"""
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+        await self.sink.close()
+
+
+async def bench(args):
+    rng = random.Random(0)
+    # Связи между документами пересекаются: часть рёбер приходит с обеих сторон
+    documents = [f"doc-{i}" for i in range(args.docs)]
+    stream = [(source, [(rng.choice(documents), rng.random()) for _ in range(args.links)])
+              for source in documents]
+
+    # Без буфера каждое ребро — отдельное обращение, поэтому замер на части потока
+    for max_batch, documents in ((1, stream[:args.baseline_docs]), (args.batch, stream)):
+        sink = MemorySink(latency_ms=args.latency_ms, row_us=args.row_us)
+        writer = LinkWriter(sink, max_batch=max_batch, max_delay_ms=args.delay_ms,
+                            max_buffer=max(max_batch * 4, 1000))
+        await writer.start()
+        started = time.perf_counter()
+        for source, links in documents:
+            await writer.add(source, links)
+        await writer.close()
+        elapsed = time.perf_counter() - started
+        print(f"max_batch {max_batch:5d}: {writer.added} links -> {writer.written} edges "
+              f"in {sink.batches} batches, {elapsed:.2f} s, {writer.added / elapsed:.0f} links/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетная запись связей")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench_parser = commands.add_parser("bench", help="Пропускная способность с приёмником в памяти")
+    bench_parser.add_argument("--docs", type=int, default=2000)
+    bench_parser.add_argument("--links", type=int, default=100)
+    bench_parser.add_argument("--batch", type=int, default=5000)
+    bench_parser.add_argument("--baseline-docs", type=int, default=20, help="Документов для замера без буфера")
+    bench_parser.add_argument("--delay-ms", type=float, default=100)
+    bench_parser.add_argument("--latency-ms", type=float, default=2.0, help="Задержка одного обращения")
+    bench_parser.add_argument("--row-us", type=float, default=5.0, help="Стоимость записи одного ребра")
+    bench_parser.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
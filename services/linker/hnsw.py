@@ -0,0 +1,166 @@
+"""HNSW-индекс для поиска похожих документов внутри процесса линкера
+
+FaissHNSWIndex — граф faiss.IndexHNSWFlat на C++ с SIMD: вставка и запрос —
+доли миллисекунды. Без HNSW (небольшие корпуса, эталон точности) линкер
+использует ExactIndex из exact.py с тем же интерфейсом.
+
+Hierarchical Navigable Small World (Malkov, Yashunin): многоуровневый граф
+близости, где поиск спускается жадно по разреженным верхним уровням и
+заканчивается поиском с очередью ef на нижнем. Метрика — косинусная близость:
+векторы нормируются при вставке, сходство = скалярное произведение.
+
+Параметры:
+    M               — соседей на верхних уровнях (на нижнем — 2M); больше M — выше
+                      точность и память
+    ef_construction — ширина поиска при вставке; влияет на качество графа
+    ef_search       — ширина поиска при запросе; главный рычаг точность/скорость
+
+Точность против точного поиска и задержка:
+    python hnsw.py bench --n 20000 --dim 384 --ef 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from exact import normalize, top_k
+
+
+class FaissHNSWIndex:
+    """HNSW из faiss с тем же интерфейсом, что у ExactIndex
+
+    Граф — faiss.IndexHNSWFlat по скалярному произведению нормированных
+    векторов (M соседей, 2M на нижнем уровне). Вектор в графе faiss обновить
+    нельзя, поэтому повторная вставка известного id ничего не меняет —
+    повторное событие того же документа несёт тот же вектор.
+    """
+
+    def __init__(self, dim: int, M: int = 16, ef_construction: int = 100, ef_search: int = 32):
+        import faiss
+
+        self.dim = dim
+        self.ef_search = ef_search
+        self._graph = faiss.IndexHNSWFlat(dim, M, faiss.METRIC_INNER_PRODUCT)
+        self._graph.hnsw.efConstruction = ef_construction
+        self._graph.hnsw.efSearch = ef_search
+        self._search_params = faiss.SearchParametersHNSW
+        self._ids = []
+        self._index = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._index
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Нормированные векторы всех вставленных документов (копия из хранилища faiss)"""
+        return self._graph.reconstruct_n(0, len(self._ids))
+
+    @property
+    def ids(self) -> list:
+        return self._ids
+
+    def position(self, doc_id):
+        """Номер строки документа в vectors или None"""
+        return self._index.get(doc_id)
+
+    def add(self, doc_id, vector):
+        self.add_many([doc_id], np.asarray(vector)[None])
+
+    def add_many(self, doc_ids, vectors: np.ndarray):
+        """Вставить пачку документов; faiss строит связи пачки в несколько потоков"""
+        fresh = []
+        for i, doc_id in enumerate(doc_ids):
+            if doc_id not in self._index:
+                self._index[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+                fresh.append(i)
+        if fresh:
+            self._graph.add(normalize(np.asarray(vectors)[fresh]))
+
+    def search(self, vector, k: int = 10, threshold: float = None, ef: int = None,
+               exclude=None) -> list:
+        """До k ближайших документов как [(doc_id, сходство)] по убыванию сходства"""
+        if not self._ids:
+            return []
+        extra = 1 if exclude is not None else 0
+        params = self._search_params(efSearch=max(ef or self.ef_search, k + extra))
+        scores, rows = self._graph.search(normalize(vector)[None], min(k + extra, len(self._ids)), params=params)
+
+        results = []
+        for similarity, row in zip(scores[0].tolist(), rows[0].tolist()):
+            if row < 0 or (threshold is not None and similarity < threshold):
+                break
+            doc_id = self._ids[row]
+            if doc_id == exclude:
+                continue
+            results.append((doc_id, similarity))
+            if len(results) == k:
+                break
+        return results
+
+
+def recall(index, queries: np.ndarray, k: int = 10, ef: int = None) -> float:
+    """Доля истинных k ближайших (по точному поиску), найденных индексом"""
+    queries = normalize(queries)
+    exact, _ = top_k(index.vectors, queries, k)
+    k = exact.shape[1]
+    hits = 0
+    for query, truth in zip(queries, exact):
+        found = {index.position(doc_id) for doc_id, _ in index.search(query, k, ef=ef)}
+        hits += len(found.intersection(truth.tolist()))
+    return hits / (len(queries) * k)
+
+
+def clustered(rng, n: int, dim: int, clusters: int = 256) -> np.ndarray:
+    """Синтетические векторы с кластерной структурой, как у реальных эмбеддингов"""
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    points = centers[rng.integers(0, clusters, size=n)] + 1.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def bench(args):
+    rng = np.random.default_rng(0)
+    data = clustered(rng, args.n + args.queries, args.dim)
+    base, queries = data[:args.n], data[args.n:]
+
+    index = FaissHNSWIndex(args.dim, M=args.M, ef_construction=args.ef_construction, ef_search=args.ef)
+    # По одной, как в линкере: каждое событие — одна вставка
+    latencies = []
+    for i, vector in enumerate(base):
+        started = time.perf_counter()
+        index.add(i, vector)
+        latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1000
+    print(f"build: {args.n} vectors in {latencies.sum() / 1000:.1f} s "
+          f"({args.n / latencies.sum() * 1000:.0f} inserts/s, p99 {np.percentile(latencies, 99):.2f} ms)")
+
+    for ef in sorted({args.k, args.ef // 2, args.ef, args.ef * 2}):
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, args.k, threshold=args.threshold, ef=ef)
+            latencies.append(time.perf_counter() - started)
+        latencies = np.array(latencies) * 1000
+        print(f"ef {ef:4d}: recall@{args.k} {recall(index, queries, args.k, ef=ef):.3f}, "
+              f"p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HNSW-индекс линкера")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench_parser = commands.add_parser("bench", help="Скорость вставки, задержка и recall против точного поиска")
+    bench_parser.add_argument("--n", type=int, default=20000)
+    bench_parser.add_argument("--dim", type=int, default=384)
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("--k", type=int, default=10)
+    bench_parser.add_argument("--M", type=int, default=16)
+    bench_parser.add_argument("--ef-construction", type=int, default=100)
+    bench_parser.add_argument("--ef", type=int, default=32)
+    bench_parser.add_argument("--threshold", type=float, default=None)
+    bench_parser.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,67 @@
+"""Метрики линкера в формате Prometheus (GET http://<host>:METRICS_PORT/metrics)"""
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Границы от долей миллисекунды до десятков секунд
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "linker_stage_seconds",
+    "Время этапов обработки сообщения",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+MESSAGES_IN = Counter("linker_messages_in_total", "Получено сообщений document.embedded")
+MESSAGES_OUT = Counter("linker_messages_out_total", "Опубликовано сообщений document.linked")
+ERRORS = Counter("linker_errors_total", "Ошибки обработки", ["stage"])
+
+LINKS_FOUND = Histogram(
+    "linker_links_per_document",
+    "Найдено связей на документ",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+TAG_LINKS_FOUND = Histogram(
+    "linker_tag_links_per_document",
+    "Найдено документов со схожими тегами",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+TAG_INDEX_DOCUMENTS = Gauge("linker_tag_index_documents", "Документов в индексе тегов")
+INDEX_VECTORS = Gauge("linker_index_vectors", "Векторов в индексе поиска связей", ["model"])
+
+LINK_EDGES = Counter("linker_graph_edges_total", "Рёбер, отправленных в Neo4j, по исходу: written, failed, dropped",
+                     ["result"])
+LINK_FLUSH_SECONDS = Histogram(
+    "linker_graph_flush_seconds",
+    "Время записи одной пачки связей",
+    buckets=LATENCY_BUCKETS,
+)
+LINK_BUFFER = Gauge("linker_graph_buffer_edges", "Рёбер в буфере перед записью")
+
+PAGERANK_PUSHES = Counter("linker_pagerank_pushes_total", "Локальных проталкиваний остатка PageRank")
+PAGERANK_REFRESH_SECONDS = Histogram(
+    "linker_pagerank_refresh_seconds",
+    "Время полного пересчёта PageRank",
+    buckets=LATENCY_BUCKETS,
+)
+PAGERANK_RESIDUAL = Gauge("linker_pagerank_residual", "Средний |остаток| PageRank после пересчёта")
+
+IN_FLIGHT = Gauge("linker_in_flight", "Сообщений в обработке")
+PENDING_MESSAGES = Gauge("linker_subscription_pending_messages", "Сообщений в буфере подписки NATS")
+PENDING_BYTES = Gauge("linker_subscription_pending_bytes", "Байт в буфере подписки NATS")
+
+
+def watch_subscription(*subs):
+    """Отдавать суммарный размер буферов подписок при каждом чтении метрик"""
+    PENDING_MESSAGES.set_function(lambda: sum(sub.pending_msgs for sub in subs))
+    PENDING_BYTES.set_function(lambda: sum(sub.pending_bytes for sub in subs))
+
+
+def start_metrics_server(port: int):
+    if port <= 0:
+        return
+    start_http_server(port)
+    logger.info(f"📊 Metrics on :{port}/metrics")
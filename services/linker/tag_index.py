@@ -0,0 +1,178 @@
+"""MinHash-LSH по тегам: кандидаты со сходством Жаккара без обхода всего корпуса
+
+Сигнатура набора тегов — num_perm минимумов хэш-функций вида
+(h(тег) xor seed) * odd по модулю 2^64; доля совпавших позиций двух сигнатур
+оценивает их сходство Жаккара. Сигнатура режется на bands полос по
+rows = num_perm / bands значений. Документы с хотя бы одной одинаковой полосой
+попадают в общую корзину. Для пары со сходством s вероятность стать
+кандидатами равна 1 - (1 - s^rows)^bands; порог этой кривой примерно
+(1 / bands)^(1 / rows).
+
+Кандидаты из корзин проверяются точным Жаккаром по сохранённым наборам.
+Корзины популярного тега могут быть огромными, поэтому из каждой берутся
+не больше max_candidates последних документов. Так запрос остаётся
+примерно постоянным по времени при любом размере корпуса.
+
+    python tag_index.py bench --docs 200000
+"""
+import argparse
+import hashlib
+import time
+from collections import Counter
+from itertools import islice
+
+import numpy as np
+
+
+def _token_hash(tag: str) -> int:
+    return int.from_bytes(hashlib.blake2b(tag.encode(), digest_size=8).digest(), "little")
+
+
+def normalize_tags(tags) -> frozenset:
+    return frozenset(str(tag).strip().lower() for tag in tags if str(tag).strip())
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TagIndex:
+    """Индекс наборов тегов документов для поиска по сходству Жаккара"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 32, max_candidates: int = 200, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) должно делиться на bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_candidates = max_candidates
+        rng = np.random.default_rng(seed)
+        self._seeds = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._multipliers = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        # Корзина: упорядоченный словарь doc_id -> None (порядок вставки, удаление за O(1))
+        self._buckets = [dict() for _ in range(bands)]
+        self._tags = {}
+        self._keys = {}
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._tags
+
+    def tags(self, doc_id) -> frozenset:
+        return self._tags.get(doc_id, frozenset())
+
+    def signature(self, tags: frozenset) -> np.ndarray:
+        hashes = np.fromiter((_token_hash(tag) for tag in tags), dtype=np.uint64, count=len(tags))
+        # Умножение по модулю 2^64 — переполнение uint64 здесь нужно
+        with np.errstate(over="ignore"):
+            mixed = (hashes[:, None] ^ self._seeds) * self._multipliers
+        return mixed.min(axis=0)
+
+    def _band_keys(self, tags: frozenset) -> list:
+        signature = self.signature(tags)
+        return [hash(signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, doc_id, tags):
+        """Добавить документ или заменить его теги"""
+        tags = normalize_tags(tags)
+        self.remove(doc_id)
+        if not tags:
+            return
+        keys = self._band_keys(tags)
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, {})[doc_id] = None
+        self._tags[doc_id] = tags
+        self._keys[doc_id] = keys
+
+    def remove(self, doc_id):
+        keys = self._keys.pop(doc_id, None)
+        if keys is None:
+            return
+        del self._tags[doc_id]
+        for band, key in enumerate(keys):
+            bucket = self._buckets[band][key]
+            bucket.pop(doc_id, None)
+            if not bucket:
+                del self._buckets[band][key]
+
+    def search(self, tags, k: int = 10, threshold: float = 0.5, exclude=None) -> list:
+        """До k документов как [(doc_id, Жаккар)] по убыванию сходства"""
+        tags = normalize_tags(tags)
+        if not tags:
+            return []
+        candidates = set()
+        for band, key in enumerate(self._band_keys(tags)):
+            bucket = self._buckets[band].get(key)
+            if bucket:
+                # Самые свежие документы корзины
+                candidates.update(islice(reversed(bucket), self.max_candidates))
+        candidates.discard(exclude)
+
+        found = []
+        for doc_id in candidates:
+            similarity = jaccard(tags, self._tags[doc_id])
+            if similarity >= threshold:
+                found.append((doc_id, similarity))
+        found.sort(key=lambda item: -item[1])
+        return found[:k]
+
+
+def bench(args):
+    rng = np.random.default_rng(0)
+    # Частоты тегов по Ципфу: несколько очень популярных, длинный хвост редких
+    vocabulary = [f"tag-{i}" for i in range(args.vocabulary)]
+    weights = 1 / np.arange(1, args.vocabulary + 1) ** 1.1
+    weights /= weights.sum()
+    sizes = rng.integers(1, args.max_tags + 1, size=args.docs)
+    documents = [frozenset(rng.choice(vocabulary, size=size, replace=False, p=weights).tolist()) for size in sizes]
+
+    index = TagIndex(num_perm=args.num_perm, bands=args.bands, max_candidates=args.max_candidates)
+    started = time.perf_counter()
+    for doc_id, tags in enumerate(documents):
+        index.add(doc_id, tags)
+    build = time.perf_counter() - started
+    print(f"build: {args.docs} documents in {build:.1f} s ({args.docs / build:.0f} docs/s), "
+          f"rows per band {index.rows}, curve threshold ≈ {(1 / index.bands) ** (1 / index.rows):.2f}")
+
+    queries = rng.integers(0, args.docs, size=args.queries)
+    started = time.perf_counter()
+    lsh = [index.search(documents[q], args.k, args.threshold, exclude=int(q)) for q in queries]
+    lsh_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    started = time.perf_counter()
+    exact = []
+    for q in queries:
+        scored = [(doc_id, jaccard(documents[q], tags)) for doc_id, tags in enumerate(documents) if doc_id != q]
+        scored = [item for item in scored if item[1] >= args.threshold]
+        exact.append(sorted(scored, key=lambda item: -item[1])[:args.k])
+    exact_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    # Полнота по значениям сходства: документы с равным Жаккаром взаимозаменяемы
+    hits = sum(sum((Counter(round(s, 6) for _, s in a) & Counter(round(s, 6) for _, s in b)).values())
+               for a, b in zip(lsh, exact))
+    total = sum(len(b) for b in exact)
+    print(f"query: LSH {lsh_ms:.2f} ms, exact scan {exact_ms:.1f} ms, "
+          f"top-{args.k} recall ≈ {hits / total if total else 1:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MinHash-LSH индекс тегов")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench_parser = commands.add_parser("bench", help="Скорость и полнота против полного перебора")
+    bench_parser.add_argument("--docs", type=int, default=50000)
+    bench_parser.add_argument("--vocabulary", type=int, default=2000)
+    bench_parser.add_argument("--max-tags", type=int, default=6)
+    bench_parser.add_argument("--queries", type=int, default=100)
+    bench_parser.add_argument("--k", type=int, default=20)
+    bench_parser.add_argument("--threshold", type=float, default=0.5)
+    bench_parser.add_argument("--num-perm", type=int, default=64)
+    bench_parser.add_argument("--bands", type=int, default=32)
+    bench_parser.add_argument("--max-candidates", type=int, default=200)
+    bench_parser.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,140 @@
+"""Тесты LinkWriter с приёмником в памяти
+
+    cd services/linker && python -m pytest -q test_graph_writer.py
+"""
+import asyncio
+import time
+
+from graph_writer import LinkWriter, MemorySink
+
+
+class FailingSink(MemorySink):
+    """Приёмник, который отказывает, пока не выставлен available"""
+
+    def __init__(self):
+        super().__init__()
+        self.available = False
+        self.failures = 0
+
+    async def write(self, link_type: str, rows: list):
+        if not self.available:
+            self.failures += 1
+            raise ConnectionError("neo4j is down")
+        await super().write(link_type, rows)
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=10))
+
+
+def test_repeated_edges_are_written_once_with_latest_similarity():
+    async def scenario():
+        sink = MemorySink()
+        writer = LinkWriter(sink, max_batch=100, max_delay_ms=10_000)
+        await writer.start()
+        await writer.add("a", [("b", 0.5), ("c", 0.6)])
+        await writer.add("a", [("b", 0.9)])
+        await writer.close()
+        return sink, writer
+
+    sink, writer = run(scenario())
+    assert sink.edges == {("similar", "a", "b"): 0.9, ("similar", "a", "c"): 0.6}
+    assert writer.added == 3
+    assert writer.written == 2
+
+
+def test_symmetric_edges_collapse_directed_edges_do_not():
+    async def scenario():
+        sink = MemorySink()
+        writer = LinkWriter(sink, max_batch=100, max_delay_ms=10_000)
+        await writer.start()
+        await writer.add("b", [("a", 0.7)])
+        await writer.add("a", [("b", 0.8)])
+        await writer.add("b", [("a", 0.3)], link_type="references")
+        await writer.add("a", [("b", 0.4)], link_type="references")
+        await writer.close()
+        return sink
+
+    sink = run(scenario())
+    assert sink.edges == {
+        ("similar", "a", "b"): 0.8,
+        ("references", "b", "a"): 0.3,
+        ("references", "a", "b"): 0.4,
+    }
+
+
+def test_flushes_when_batch_is_full():
+    async def scenario():
+        sink = MemorySink()
+        writer = LinkWriter(sink, max_batch=5, max_delay_ms=10_000)
+        await writer.start()
+        await writer.add("a", [(f"t{i}", 0.9) for i in range(5)])
+        for _ in range(100):
+            if sink.batches:
+                break
+            await asyncio.sleep(0.01)
+        batches = sink.batches
+        await writer.close()
+        return batches
+
+    assert run(scenario()) == 1
+
+
+def test_flushes_after_max_delay():
+    async def scenario():
+        sink = MemorySink()
+        writer = LinkWriter(sink, max_batch=1000, max_delay_ms=50)
+        await writer.start()
+        started = time.monotonic()
+        await writer.add("a", [("b", 0.9)])
+        await asyncio.sleep(0.01)
+        early = sink.batches
+        while not sink.batches and time.monotonic() - started < 2:
+            await asyncio.sleep(0.01)
+        elapsed = time.monotonic() - started
+        await writer.close()
+        return early, sink.batches, elapsed
+
+    early, batches, elapsed = run(scenario())
+    assert early == 0
+    assert batches == 1
+    assert 0.04 <= elapsed < 1
+
+
+def test_close_drains_buffer():
+    async def scenario():
+        sink = MemorySink()
+        writer = LinkWriter(sink, max_batch=3, max_delay_ms=10_000)
+        await writer.start()
+        await writer.add("a", [(f"t{i}", 0.9) for i in range(7)])
+        await writer.add("b", [("x", 0.8)], link_type="tags")
+        await writer.close()
+        return sink, writer
+
+    sink, writer = run(scenario())
+    assert len(sink.edges) == 8
+    assert len(writer) == 0
+    assert writer.written == 8
+
+
+def test_full_buffer_drops_oldest_after_max_wait():
+    async def scenario():
+        sink = FailingSink()
+        writer = LinkWriter(sink, max_batch=10, max_delay_ms=10, max_buffer=10, max_wait_ms=50)
+        await writer.start()
+        started = time.monotonic()
+        for i in range(6):
+            await writer.add(f"s{i}", [(f"t{i}-{j}", 0.9) for j in range(5)])
+        elapsed = time.monotonic() - started
+        sink.available = True
+        await writer.close()
+        return sink, writer, elapsed
+
+    sink, writer, elapsed = run(scenario())
+    assert elapsed < 2
+    assert sink.failures > 0
+    assert writer.dropped > 0
+    assert writer.written + writer.dropped == writer.added
+    # Отбрасываются самые старые рёбра, последние дошли до приёмника
+    assert ("similar", "s5", "t5-4") in sink.edges
+    assert ("similar", "s0", "t0-0") not in sink.edges